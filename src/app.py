@@ -1,13 +1,163 @@
 import utils
 import constants
 import entities
+import jobs
+import metrics
+import browser
+from jobs import job_manager
+from store import result_store
 
 import streamlit as st
 import os
+import copy
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 
 
+def run_overview(job, url):
+    """
+    Job generating the overview of a review.
+
+    Args:
+        job (jobs.Job): The job handle.
+        url (str): The URL of the review.
+
+    Returns:
+        entities.Review: The review.
+    """
+    job.set_progress(0.0, "Generating review overview for the selected url...")
+    return entities.Reviews.get_overview(url)
+
+
+def run_benchmark_data(job, review, images):
+    """
+    Job generating the benchmark data of a review, reporting rows as they arrive.
+
+    Args:
+        job (jobs.Job): The job handle.
+        review (entities.Review): A copy of the review, updated by the job while the page shows the session's review.
+        images (list): List of uploaded images, None for YouTube reviews.
+
+    Returns:
+        entities.Review: The review with benchmark data.
+    """
+    job.set_progress(0.0, "Capturing images...")
+    if images:
+        content_hash = utils.get_images_hash(images)
+    else:
+        content_hash = utils.get_content_hash(review.url)
+
+    def compute():
+        for processed, total, benchmarks in review.iter_benchmark_data(images=images):
+            job.set_progress(
+                processed / total,
+                f"Processed {processed} of {total} images",
+                partial=benchmarks,
+            )
+        return review.benchmarks
+
+    review.benchmarks = result_store.get_or_compute(
+        result_store.make_key(
+            "benchmarks", review.url, review.capture_backend, content_hash
+        ),
+        compute,
+        # Partial results are not shared, so that the dropped images are retried
+        should_store=lambda benchmarks: content_hash
+        and not benchmarks.empty
+        and not review.failed_images,
+    )
+    return review
+
+
+def run_overall_summary(job, urls):
+    """
+    Job generating the overall summary of the reviews.
+
+    Args:
+        job (jobs.Job): The job handle.
+        urls (list): List of review URLs.
+
+    Returns:
+        entities.Reviews: The reviews.
+    """
+    job.set_progress(0.0, f"Generating overall summary for {len(urls)} urls...")
+    with ThreadPoolExecutor(max_workers=constants.MAX_WORKERS) as executor:
+        content_hashes = tuple(executor.map(utils.get_content_hash, urls))
+
+    def compute():
+        reviews = entities.Reviews(urls)
+        # Reporting progress after every overview lets the job be cancelled in between
+        reviews.set_summary(
+            progress=lambda done, total: job.set_progress(
+                done / (total + 1), f"Generated {done} of {total} review overviews..."
+            )
+        )
+        return reviews
+
+    return result_store.get_or_compute(
+        result_store.make_key("summary", tuple(urls), content_hashes),
+        compute,
+        should_store=lambda reviews: all(content_hashes) and reviews.summary,
+    )
+
+
+def get_job_id(name):
+    """
+    Get the ID of a job of the session. The ID is kept in the URL so that it survives reconnects.
+
+    Args:
+        name (str): Name of the job in the session.
+
+    Returns:
+        str: The ID of the job, or None.
+    """
+    return st.query_params.get(f"{name}_job")
+
+
+def set_job_id(name, job_id):
+    """
+    Set or clear the ID of a job of the session.
+
+    Args:
+        name (str): Name of the job in the session.
+        job_id (str): The ID of the job, or None to clear it.
+    """
+    if job_id:
+        st.query_params[f"{name}_job"] = job_id
+    elif f"{name}_job" in st.query_params:
+        del st.query_params[f"{name}_job"]
+
+
+def show_job(job_id, cancellable=True):
+    """
+    Display the status of a job, with a cancel button while it is active.
+
+    Args:
+        job_id (str): The ID of the job.
+        cancellable (bool, optional): Whether the job stops when cancelled while running. Queued jobs can always be cancelled.
+
+    Returns:
+        dict: The job, or None if it is unknown.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return None
+    if job["status"] in jobs.ACTIVE_STATUSES:
+        st.progress(job["progress"], text=job["message"] or "Waiting in queue...")
+        if (cancellable or job["status"] == jobs.QUEUED) and st.button(
+            "Cancel", key=f"cancel_{job_id}"
+        ):
+            job_manager.cancel(job_id)
+    elif job["status"] == jobs.FAILED:
+        st.error(f"Job failed: {job['error']}")
+    elif job["status"] == jobs.CANCELLED:
+        st.warning("Job cancelled.")
+    return job
+
+
 def main():
     # Set Streamlit page configuration
     st.set_page_config(layout="wide")
@@ -28,11 +178,18 @@ def main():
         # Check if it is the first run
         if "first_run" not in st.session_state:
             # Create necessary directory for data storage
-            utils.create_directory(constants.DATA_DIR, overwrite=True)
+            utils.create_directory(constants.DATA_DIR)
+            # Launch headless browsers in the background for YouTube captures, once per process
+            browser.start_warming(constants.BROWSER_WARM)
+            # Serve pipeline metrics to Prometheus
+            metrics.start_server()
             # Mark that it's not the first run
             st.session_state["first_run"] = True
-            # Initialize previous URL as None
-            st.session_state["previous_url"] = None
+            # Restore the previous URL of a reconnecting session
+            st.session_state["previous_url"] = st.query_params.get("url")
+
+        # Set when a job is running so that the page is refreshed
+        jobs_active = False
 
         # List of input URLs
         options = ["Select a review URL"]
@@ -51,20 +208,34 @@ def main():
         # Individual Review tab functionality
         with tab1:
             # Dropdown to select review URL
+            previous_url = st.session_state["previous_url"]
             selected_url = st.selectbox(
-                "Select a review URL", options, index=0, label_visibility="hidden"
+                "Select a review URL",
+                options,
+                index=options.index(previous_url) if previous_url in options else 0,
+                label_visibility="hidden",
             )
             if selected_url != "Select a review URL":
                 # Display review overview
                 st.subheader("Review Overview")
                 if selected_url != st.session_state["previous_url"]:
                     st.session_state["previous_url"] = selected_url
-                    with st.spinner(
-                        "***:blue[Generating review overview for the selected url...]***"
-                    ):
-                        review = entities.Review(selected_url)
-                        review.set_overview()
-                        st.session_state["review"] = review
+                    st.session_state.pop("review", None)
+                    st.query_params["url"] = selected_url
+                    set_job_id(
+                        "overview",
+                        job_manager.submit("overview", run_overview, selected_url),
+                    )
+                    set_job_id("benchmark", None)
+
+                if "review" not in st.session_state:
+                    job_id = get_job_id("overview")
+                    # An overview is a single pipeline run that cannot stop midway
+                    job = show_job(job_id, cancellable=False)
+                    if job and job["status"] == jobs.DONE:
+                        st.session_state["review"] = job_manager.result(job_id)
+                    elif job and job["status"] in jobs.ACTIVE_STATUSES:
+                        jobs_active = True
 
                 if "review" in st.session_state:
                     review = st.session_state["review"]
@@ -77,13 +248,15 @@ def main():
 
                 if "review" in st.session_state and review.benchmarks is None:
                     review = st.session_state["review"]
+                    job_id = get_job_id("benchmark")
 
-                    if review.is_youtube:
-                        with st.spinner(
-                            "***:blue[Generating benchmark data. This may take few minutes based on the duration of the video...]***"
-                        ):
-                            review.set_benchmark_data(images=None)
-                    else:
+                    if job_id is None and review.is_youtube:
+                        # The session's review is only replaced by the job result
+                        job_id = job_manager.submit(
+                            "benchmark", run_benchmark_data, copy.deepcopy(review), None
+                        )
+                        set_job_id("benchmark", job_id)
+                    elif job_id is None:
                         st.info(
                             """
                             NOTE: Benchmark data cannot be automatically fetched for non-YouTube sites as they typically block bots.
@@ -95,14 +268,40 @@ def main():
                             accept_multiple_files=True,
                             label_visibility="hidden",
                         )
-                        if st.button("Fetch Benchmark Data"):
-                            with st.spinner(
-                                "***:blue[Generating benchmark data. This may take few minutes based on the number of images...]***"
-                            ):
-                                if images:
-                                    review.set_benchmark_data(images=images)
+                        if st.button("Fetch Benchmark Data") and images:
+                            # Copy the uploads as they are released after the script run
+                            images = [BytesIO(image.getvalue()) for image in images]
+                            job_id = job_manager.submit(
+                                "benchmark",
+                                run_benchmark_data,
+                                copy.deepcopy(review),
+                                images,
+                            )
+                            set_job_id("benchmark", job_id)
+
+                    if job_id is not None:
+                        job = show_job(job_id)
+                        if job and job["status"] == jobs.DONE:
+                            review = job_manager.result(job_id)
+                            st.session_state["review"] = review
+                        elif job and job["status"] in jobs.ACTIVE_STATUSES:
+                            jobs_active = True
+                            benchmarks = job_manager.partial(job_id)
+                            if benchmarks is not None:
+                                st.dataframe(
+                                    benchmarks,
+                                    hide_index=True,
+                                    use_container_width=True,
+                                )
+                        elif job and not review.is_youtube:
+                            # Allow screenshots to be uploaded again
+                            set_job_id("benchmark", None)
 
                 if "review" in st.session_state and review.benchmarks is not None:
+                    if review.failed_images:
+                        st.warning(
+                            f"{review.failed_images} images could not be analyzed, their benchmark data is missing."
+                        )
                     st.dataframe(
                         review.benchmarks,
                         hide_index=True,
@@ -110,7 +309,7 @@ def main():
                     )
 
                     data = review.download_csv()
-                    filename_csv = f'review_{os.path.basename(review.dir_path)}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv'
+                    filename_csv = f'review_{(review.website_name or "").replace(" ", "")}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv'
                     st.download_button(
                         label="Download as CSV",
                         data=data,
@@ -118,19 +317,31 @@ def main():
                         mime="text/csv",
                     )
 
+                if "review" in st.session_state:
+                    with st.expander("Timings"):
+                        st.dataframe(
+                            utils.get_timings_df(review.trace),
+                            hide_index=True,
+                            use_container_width=True,
+                        )
+
         # Overall Summary tab functionality
         with tab2:
-            n = len(input_urls)
+            job_id = get_job_id("summary")
+            job = job_manager.get(job_id)
             if (
                 st.button("Generate Overall Summary")
                 and "reviews" not in st.session_state
+                and (job is None or job["status"] not in jobs.ACTIVE_STATUSES)
             ):
-                with st.spinner(
-                    f"***:blue[Generating overall summary for {n} urls. This may take few minutes based on the number of urls...]***"
-                ):
-                    reviews = entities.Reviews(input_urls)
-                    reviews.set_summary()
-                    st.session_state["reviews"] = reviews
+                job_id = job_manager.submit("summary", run_overall_summary, input_urls)
+                set_job_id("summary", job_id)
+            if "reviews" not in st.session_state and job_id is not None:
+                job = show_job(job_id)
+                if job and job["status"] == jobs.DONE:
+                    st.session_state["reviews"] = job_manager.result(job_id)
+                elif job and job["status"] in jobs.ACTIVE_STATUSES:
+                    jobs_active = True
             if "reviews" in st.session_state:
                 reviews = st.session_state["reviews"]
 
@@ -155,6 +366,18 @@ def main():
                     mime="text/csv",
                 )
 
+                with st.expander("Timings"):
+                    st.dataframe(
+                        utils.get_timings_df(reviews.trace),
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+
+        # Poll running jobs
+        if jobs_active:
+            time.sleep(constants.JOB_POLL_INTERVAL)
+            st.rerun()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,528 @@
+"""
+Offline benchmark suite for the review pipeline.
+
+Times every pipeline stage (fetch, chunk/embed, retrieval, LLM, frame capture,
+DataFrame build, CSV export) across data sizes and concurrency levels without
+API keys or network access, and writes a JSON report for regression tracking.
+
+Gemini, the embedding API, web pages, transcripts and YouTube metadata are
+replaced by deterministic fakes with configurable latency. Recorded pages and
+transcripts can be used instead of synthetic ones with `--fixtures`.
+
+Usage:
+    python src/bench.py --output bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARK_NAMES = ["Cinebench R23", "Geekbench 6.2", "PCMark 10", "3DMark", "GFXBench"]
+PRODUCT_NAMES = ["Core Ultra 7 155H", "i7-1360P", "Ryzen 7 7840U", "M3", "i5-1340P"]
+WORDS = (
+    "the laptop delivers strong performance with the new processor while battery "
+    "life improves and graphics scores rise in Cinebench and Geekbench tests"
+).split()
+
+
+class FakeEmbeddings:
+    """
+    Deterministic stand-in for GoogleGenerativeAIEmbeddings.
+    """
+
+    latency = 0.0
+    dimensions = 64
+
+    def __init__(self, model=None, **kwargs):
+        self.model = model
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for word in text.split():
+            digest = hashlib.md5(word.encode()).digest()
+            vector[digest[0] % self.dimensions] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChatModel:
+    """
+    Deterministic stand-in for ChatGoogleGenerativeAI.
+    """
+
+    latency = 0.0
+
+    def __init__(self, model=None, temperature=None, **kwargs):
+        self.model = model
+        self.temperature = temperature
+
+    def __call__(self, messages):
+        time.sleep(self.latency)
+        prompt = "\n".join(message.content for message in messages)
+        digest = hashlib.md5(prompt.encode()).hexdigest()
+        return FakeMessage(
+            json.dumps(
+                {
+                    "title": f"Review {digest[:8]}",
+                    "author": "Bench Author",
+                    "summary": f"Summary {digest} of a prompt with {len(prompt)} characters.",
+                }
+            )
+        )
+
+
+class FakeVisionModel:
+    """
+    Deterministic stand-in for GeminiMultiModal.
+    """
+
+    latency = 0.0
+
+    def __init__(self, model_name=None, temperature=None, **kwargs):
+        self.model_name = model_name
+        self.temperature = temperature
+
+    @staticmethod
+    def _benchmark(image_document):
+        seed = int(hashlib.md5(str(image_document.image_path).encode()).hexdigest(), 16)
+        rng = random.Random(seed)
+        return {
+            "is_benchmark": True,
+            "name": rng.choice(BENCHMARK_NAMES),
+            "type": "CPU",
+            "metric": "Score",
+            "products": [
+                {"name": name, "score": rng.randint(1000, 20000)}
+                for name in rng.sample(PRODUCT_NAMES, 3)
+            ],
+        }
+
+    def complete(self, prompt, image_documents, **kwargs):
+        from llama_index.llms import CompletionResponse
+
+        time.sleep(self.latency)
+        benchmarks = [self._benchmark(image_doc) for image_doc in image_documents]
+        if len(benchmarks) == 1:
+            return CompletionResponse(text=json.dumps(benchmarks[0]))
+        return CompletionResponse(text=json.dumps({"benchmarks": benchmarks}))
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+        self.headers = {"ETag": hashlib.md5(text.encode()).hexdigest()}
+
+
+class FakeBackends:
+    """
+    Fake HTTP, transcript and YouTube metadata backends serving recorded or synthetic content.
+    """
+
+    latency = 0.0
+
+    def __init__(self, fixtures_dir=None):
+        """
+        Initialize the backends.
+
+        Args:
+            fixtures_dir (str, optional): Directory with recorded `pages/*.html` and `transcripts/*.json` files.
+        """
+        self.pages = []
+        self.transcripts = []
+        if fixtures_dir:
+            for name in sorted(os.listdir(os.path.join(fixtures_dir, "pages"))):
+                with open(os.path.join(fixtures_dir, "pages", name)) as file:
+                    self.pages.append(file.read())
+            for name in sorted(os.listdir(os.path.join(fixtures_dir, "transcripts"))):
+                with open(os.path.join(fixtures_dir, "transcripts", name)) as file:
+                    self.transcripts.append(json.load(file))
+
+    @staticmethod
+    def _words(size, seed):
+        rng = random.Random(seed)
+        return [rng.choice(WORDS) for _ in range(size)]
+
+    @staticmethod
+    def _size(url):
+        return int(url.rsplit("size=", 1)[1].split("&")[0])
+
+    def get(self, url, headers=None, **kwargs):
+        time.sleep(self.latency)
+        size = self._size(url)
+        if self.pages:
+            return FakeResponse(self.pages[size % len(self.pages)])
+        words = self._words(size, url)
+        paragraphs = [" ".join(words[i : i + 50]) for i in range(0, len(words), 50)]
+        body = "".join(f"<p>{paragraph}</p>\n" for paragraph in paragraphs)
+        return FakeResponse(
+            f"<html><head><title>{url}</title></head><body>{body}</body></html>"
+        )
+
+    def get_transcript(self, video_id):
+        time.sleep(self.latency)
+        size = self._size(video_id)
+        if self.transcripts:
+            return self.transcripts[size % len(self.transcripts)]
+        words = self._words(size, video_id)
+        return [
+            {"text": " ".join(words[i : i + 10]), "start": i / 2.5, "duration": 4.0}
+            for i in range(0, len(words), 10)
+        ]
+
+    def youtube(self, url):
+        backends = self
+
+        class FakeYouTube:
+            author = "Bench Channel"
+            title = f"Bench video {url}"
+
+            def __init__(self):
+                time.sleep(backends.latency)
+
+        return FakeYouTube()
+
+
+def install_fakes(backends, llm_latency, embedding_latency):
+    """
+    Replace the model clients and network backends by fakes.
+
+    Args:
+        backends (FakeBackends): The fake network backends.
+        llm_latency (float): Seconds slept by every chat and vision model call.
+        embedding_latency (float): Seconds slept by every embedding call.
+    """
+    import genai
+    import utils
+    from cache import response_cache
+    from throttle import RateLimiter
+
+    FakeChatModel.latency = FakeVisionModel.latency = llm_latency
+    FakeEmbeddings.latency = embedding_latency
+    genai.GoogleGenerativeAIEmbeddings = FakeEmbeddings
+    genai.ChatGoogleGenerativeAI = FakeChatModel
+    genai.GeminiMultiModal = FakeVisionModel
+    genai.vision_rate_limiter = RateLimiter(0)
+    # Measure model calls rather than response cache hits
+    response_cache.max_temperature = -1
+
+    utils.requests.get = backends.get
+    utils.YouTubeTranscriptApi.get_transcript = staticmethod(backends.get_transcript)
+    utils.YouTube = backends.youtube
+
+
+def write_video(path, duration, fps=5, size=(640, 360)):
+    """
+    Write a synthetic video whose picture changes every 10 seconds.
+
+    Args:
+        path (str): Path of the video file.
+        duration (int): Duration in seconds.
+        fps (int, optional): Frames per second.
+        size (tuple, optional): Width and height.
+    """
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    frame = None
+    for i in range(duration * fps):
+        if i % (10 * fps) == 0:
+            frame = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+def make_benchmarks(count):
+    """
+    Build synthetic generated benchmarks.
+
+    Args:
+        count (int): Number of benchmarks.
+
+    Returns:
+        List[GeneratedBenchmark]: The benchmarks.
+    """
+    from genai import GeneratedBenchmark, GeneratedProduct
+
+    rng = random.Random(count)
+    vendors = ["", "Intel ", "AMD ", "Apple "]
+    return [
+        GeneratedBenchmark(
+            is_benchmark=True,
+            name=f"{rng.choice(BENCHMARK_NAMES)} {i % 20}",
+            type=rng.choice(["CPU", "Graphics", "NPU"]),
+            metric=rng.choice(["Score", "FPS"]),
+            products=[
+                GeneratedProduct(
+                    name=rng.choice(vendors) + name, score=rng.randint(1000, 20000)
+                )
+                for name in rng.sample(PRODUCT_NAMES, 3)
+            ],
+        )
+        for i in range(count)
+    ]
+
+
+class Bench:
+    """
+    Runs the stage benchmarks and collects their timings.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+
+    def time(self, stage, func, **params):
+        """
+        Time a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            func (Callable): Function running the stage.
+            **params: Parameters of the run (size, concurrency...) recorded in the report.
+
+        Returns:
+            Any: The return value of the function.
+        """
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        self.results.append({"stage": stage, **params, "seconds": round(seconds, 6)})
+        print(f"{stage:<20} {json.dumps(params):<45} {seconds:10.4f}s", file=sys.stderr)
+        return result
+
+    def run_text_stages(self, size):
+        import genai
+        import prompts
+        import utils
+
+        dir_path = os.path.join("data", f"text_{size}")
+        url = f"https://bench.local/review?size={size}"
+        video_url = f"https://www.youtube.com/watch?v=bench-size={size}"
+
+        self.time(
+            "fetch_website",
+            lambda: utils.collect_website_content(url, dir_path),
+            size=size,
+        )
+        self.time(
+            "fetch_website_cached",
+            lambda: utils.collect_website_content(url, dir_path),
+            size=size,
+        )
+        self.time(
+            "fetch_youtube",
+            lambda: utils.collect_youtube_content(video_url, dir_path + "_yt"),
+            size=size,
+        )
+
+        with open(os.path.join(dir_path, "content.txt")) as file:
+            text = file.read()
+        chunks = self.time("chunk", lambda: genai.split_texts([text]), size=size)
+        embeddings = genai.get_embeddings()
+        vector_store = self.time(
+            "embed",
+            lambda: genai.get_vector_store(chunks, embeddings),
+            size=size,
+        )
+        self.time(
+            "embed_cached",
+            lambda: genai.get_vector_store(chunks, embeddings),
+            size=size,
+        )
+        context = self.time(
+            "retrieval",
+            lambda: genai.assemble_context(vector_store, prompts.query_review_summary),
+            size=size,
+        )
+        self.time(
+            "llm",
+            lambda: genai.generate_output(
+                genai.get_chat_model(),
+                genai.GeneratedSummary,
+                prompts.prompt_review_summary,
+                prompts.query_review_summary,
+                context,
+            ),
+            size=size,
+        )
+
+    def run_image_stages(self, images, concurrency_levels):
+        import genai
+        import utils
+
+        dir_path = os.path.join("data", f"video_{images}")
+        os.makedirs(dir_path, exist_ok=True)
+        video_path = os.path.join(dir_path, "video.mp4")
+        # One capture every 10 seconds after the skipped intro
+        write_video(video_path, 60 + images * 10)
+
+        for concurrency in concurrency_levels:
+            images_path = self.time(
+                "frame_capture",
+                lambda: utils.collect_video_images(
+                    video_path, dir_path, guided=False, shards=concurrency
+                ),
+                images=images,
+                concurrency=concurrency,
+            )
+        self.time("dedupe", lambda: utils.dedupe_images(images_path), images=images)
+        for concurrency in concurrency_levels:
+            self.time(
+                "vision",
+                lambda: genai.generate_benchmark_data(
+                    images_path, max_workers=concurrency
+                ),
+                images=images,
+                concurrency=concurrency,
+            )
+
+    def run_table_stages(self, count):
+        import entities
+        import utils
+
+        benchmarks = make_benchmarks(count)
+        review = entities.Review("https://bench.local/review")
+        review.benchmarks = self.time(
+            "dataframe",
+            lambda: utils.get_benchmarks_df(benchmarks),
+            benchmarks=count,
+        )
+        self.time("csv_export", review.download_csv, benchmarks=count)
+
+    def run_overview_stages(self, urls, concurrency_levels):
+        import entities
+
+        for concurrency in concurrency_levels:
+            # Distinct URLs so that every level starts with cold caches
+            review_urls = [
+                f"https://bench-{concurrency}-{i}.local/review?size=2000"
+                for i in range(urls)
+            ]
+            reviews = entities.Reviews(review_urls, max_workers=concurrency)
+            self.time(
+                "reviews_summary",
+                reviews.set_summary,
+                urls=urls,
+                concurrency=concurrency,
+            )
+
+    def run(self):
+        args = self.args
+        for size in args.sizes:
+            self.run_text_stages(size)
+        for images in args.images:
+            self.run_image_stages(images, args.concurrency)
+        for count in args.benchmarks:
+            self.run_table_stages(count)
+        self.run_overview_stages(args.urls, args.concurrency)
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",") if size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="Path of the JSON report. Defaults to stdout.")
+    parser.add_argument(
+        "--fixtures", help="Directory with recorded pages/ and transcripts/."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=[2000, 20000, 100000],
+        help="Comma separated content sizes in words.",
+    )
+    parser.add_argument(
+        "--images",
+        type=parse_sizes,
+        default=[10, 50, 200],
+        help="Comma separated numbers of captured images.",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        type=parse_sizes,
+        default=[100, 1000, 5000],
+        help="Comma separated numbers of extracted benchmarks.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=parse_sizes,
+        default=[1, 4, 8],
+        help="Comma separated worker counts.",
+    )
+    parser.add_argument(
+        "--urls",
+        type=int,
+        default=8,
+        help="Number of reviews in the overall summary stage.",
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.2, help="Seconds per fake model call."
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=float,
+        default=0.05,
+        help="Seconds per fake embedding call.",
+    )
+    parser.add_argument(
+        "--fetch-latency",
+        type=float,
+        default=0.1,
+        help="Seconds per fake network request.",
+    )
+    args = parser.parse_args()
+
+    fixtures_dir = os.path.abspath(args.fixtures) if args.fixtures else None
+    output = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Caches, logs and data are relative to the working directory, so the
+        # pipeline modules are only imported once it points to a scratch directory
+        os.chdir(work_dir)
+        backends = FakeBackends(fixtures_dir)
+        backends.latency = args.fetch_latency
+        install_fakes(backends, args.llm_latency, args.embedding_latency)
+
+        bench = Bench(args)
+        bench.run()
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": bench.results,
+    }
+    if output:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
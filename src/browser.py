@@ -0,0 +1,183 @@
+import constants
+from logger import logging
+
+import atexit
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+_warming_started = False
+
+
+def get_driver_path():
+    """
+    Get the path of the ChromeDriver binary, installing it only once per process.
+
+    Returns:
+        str: The path of the ChromeDriver binary.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
+
+def launch_driver():
+    """
+    Launch a headless Chrome browser.
+
+    Returns:
+        webdriver.Chrome: The browser.
+    """
+    options = Options()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--headless")
+    options.add_argument("--disable-dev-shm-usage")
+    driver = webdriver.Chrome(service=Service(get_driver_path()), options=options)
+    driver.set_window_size(1920, 1080)
+    return driver
+
+
+def quit_driver(driver):
+    """
+    Quit a browser, ignoring errors from browsers that already died.
+
+    Args:
+        driver (webdriver.Chrome): The browser.
+    """
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.exception(e)
+
+
+class DriverPool:
+    """
+    Pool of warm headless browsers.
+
+    At most `size` browsers are alive at once. Browsers are recycled after
+    `max_uses` checkouts and discarded if the caller raises an exception.
+    """
+
+    def __init__(
+        self, size=constants.BROWSER_POOL_SIZE, max_uses=constants.BROWSER_MAX_USES
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            size (int, optional): Maximum number of browsers alive at once.
+            max_uses (int, optional): Number of checkouts after which a browser is replaced.
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # List of (driver, uses) tuples
+        self._busy = 0  # Browsers checked out or being launched
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm(self, count=1):
+        """
+        Pre-launch browsers so that the next checkouts do not pay the cold start.
+
+        Stops once the browsers alive, idle or checked out, reach `size`.
+
+        Args:
+            count (int, optional): Number of browsers to launch. Defaults to 1.
+        """
+        for _ in range(min(count, self.size)):
+            if not self._slots.acquire(blocking=False):
+                return
+            with self._lock:
+                full = len(self._idle) + self._busy >= self.size
+                if not full:
+                    self._busy += 1
+            if full:
+                self._slots.release()
+                return
+            driver = None
+            try:
+                driver = launch_driver()
+            except Exception as e:
+                logging.exception(e)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    if driver is not None:
+                        self._idle.append((driver, 0))
+                self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """
+        Check out a browser, blocking until one is available.
+
+        Yields:
+            webdriver.Chrome: The browser.
+        """
+        self._slots.acquire()
+        with self._lock:
+            driver, uses = self._idle.pop() if self._idle else (None, 0)
+            self._busy += 1
+        try:
+            if driver is None:
+                driver = launch_driver()
+
+            healthy = False
+            try:
+                yield driver
+                healthy = True
+            finally:
+                uses += 1
+                if healthy and uses < self.max_uses and not self._closed:
+                    try:
+                        driver.get("about:blank")
+                    except Exception as e:
+                        logging.exception(e)
+                        quit_driver(driver)
+                        driver = None
+                else:
+                    quit_driver(driver)
+                    driver = None
+        finally:
+            with self._lock:
+                self._busy -= 1
+                if driver is not None:
+                    self._idle.append((driver, uses))
+            self._slots.release()
+
+    def close(self):
+        """
+        Quit all idle browsers. Browsers checked out are quit when returned.
+        """
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver, _ in idle:
+            quit_driver(driver)
+
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.close)
+
+
+def start_warming(count=constants.BROWSER_WARM):
+    """
+    Warm the browser pool in a background thread, once per process.
+
+    Args:
+        count (int, optional): Number of browsers to launch.
+    """
+    global _warming_started
+    with _driver_path_lock:
+        if _warming_started:
+            return
+        _warming_started = True
+    threading.Thread(target=driver_pool.warm, args=(count,), daemon=True).start()
@@ -0,0 +1,425 @@
+import constants
+import metrics
+from logger import logging
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+class SQLiteCache:
+    """
+    Base class of the caches stored in a SQLite database.
+
+    Subclasses define the `SCHEMA` statement creating their table and its
+    name in `TABLE`.
+    """
+
+    SCHEMA = None
+    TABLE = None
+
+    def __init__(self, path):
+        """
+        Initialize the cache.
+
+        Args:
+            path (str): Path of the SQLite database.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        """
+        Open a connection to the database, creating the schema on first use.
+
+        Returns:
+            sqlite3.Connection: Database connection.
+        """
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with sqlite3.connect(self.path) as conn:
+                        conn.execute(self.SCHEMA)
+                    self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _evict(self, conn, max_bytes):
+        """
+        Delete the least recently used entries until the table fits in a size budget.
+
+        The table needs `key`, `size` and `accessed_at` columns.
+
+        Args:
+            conn (sqlite3.Connection): Database connection.
+            max_bytes (int): The size budget.
+        """
+        total = conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}"
+        ).fetchone()[0]
+        excess = total - max_bytes
+        if excess <= 0:
+            return
+        keys = []
+        for row in conn.execute(
+            f"SELECT key, size FROM {self.TABLE} ORDER BY accessed_at"
+        ):
+            if excess <= 0:
+                break
+            keys.append(row["key"])
+            excess -= row["size"]
+        conn.executemany(
+            f"DELETE FROM {self.TABLE} WHERE key = ?", [(k,) for k in keys]
+        )
+        logging.info(f"Evicted {len(keys)} entries from {self.TABLE}")
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.TABLE}")
+        except Exception as e:
+            logging.exception(e)
+
+
+class FetchCache(SQLiteCache):
+    """
+    Persistent on-disk cache for fetched transcripts, web pages and metadata.
+
+    Entries are keyed by a string such as the URL or the YouTube video ID and
+    are considered fresh for `ttl` seconds. Stale entries are still returned so
+    that the caller can revalidate them using the stored ETag/Last-Modified.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fetches (
+            key TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL
+        )
+        """
+    TABLE = "fetches"
+
+    def __init__(self, path=None, ttl=constants.FETCH_CACHE_TTL):
+        """
+        Initialize the cache.
+
+        Args:
+            path (str, optional): Path of the SQLite database. Defaults to `fetch.db` in the cache directory.
+            ttl (float, optional): Seconds an entry is considered fresh.
+        """
+        super().__init__(path or os.path.join(constants.CACHE_DIR, "fetch.db"))
+        self.ttl = ttl
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+        metrics.count(f"fetch_cache_{stat}")
+
+    def get(self, key):
+        """
+        Look up a cached entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict: The entry with `body`, `etag`, `last_modified`, `fetched_at` and `fresh` keys, or None if not cached.
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT * FROM fetches WHERE key = ?", (key,)
+                ).fetchone()
+        except Exception as e:
+            logging.exception(e)
+            row = None
+
+        if row is None:
+            self._count("misses")
+            return None
+
+        entry = dict(row)
+        entry["fresh"] = time.time() - entry["fetched_at"] < self.ttl
+        self._count("hits" if entry["fresh"] else "stale")
+        return entry
+
+    def put(self, key, body, etag=None, last_modified=None):
+        """
+        Store an entry, replacing any previous one.
+
+        Args:
+            key (str): The cache key.
+            body (str): The fetched content.
+            etag (str, optional): The ETag response header.
+            last_modified (str, optional): The Last-Modified response header.
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO fetches VALUES (?, ?, ?, ?, ?)",
+                    (key, body, etag, last_modified, time.time()),
+                )
+        except Exception as e:
+            logging.exception(e)
+
+    def touch(self, key):
+        """
+        Mark an entry as fresh after a successful revalidation.
+
+        Args:
+            key (str): The cache key.
+        """
+        self._count("revalidated")
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE fetches SET fetched_at = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        except Exception as e:
+            logging.exception(e)
+
+    def invalidate(self, key):
+        """
+        Remove a single entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            bool: True if an entry was removed, False otherwise.
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("DELETE FROM fetches WHERE key = ?", (key,))
+            return cursor.rowcount > 0
+        except Exception as e:
+            logging.exception(e)
+        return False
+
+    def stats(self):
+        """
+        Get hit/miss statistics since the cache was created.
+
+        Returns:
+            dict: Counts of fresh hits, misses, stale entries and successful revalidations.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+
+class ResponseCache(SQLiteCache):
+    """
+    Persistent cache of model responses.
+
+    Entries are keyed by a hash of the model name, temperature, rendered prompt
+    and image contents. The least recently used entries are evicted once the
+    cache grows beyond `max_bytes`.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            raw TEXT NOT NULL,
+            parsed TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """
+    TABLE = "responses"
+
+    def __init__(
+        self,
+        path=None,
+        max_bytes=constants.LLM_CACHE_MAX_BYTES,
+        max_temperature=constants.LLM_CACHE_MAX_TEMPERATURE,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path (str, optional): Path of the SQLite database. Defaults to `responses.db` in the cache directory.
+            max_bytes (int, optional): Maximum total size of the cached responses.
+            max_temperature (float, optional): Responses of models with a higher temperature are not cached.
+        """
+        super().__init__(path or os.path.join(constants.CACHE_DIR, "responses.db"))
+        self.max_bytes = max_bytes
+        self.max_temperature = max_temperature
+
+    def make_key(self, model_name, temperature, prompt, image_hashes=()):
+        """
+        Get the cache key of a model call.
+
+        Args:
+            model_name (str): Name of the model.
+            temperature (float): Sampling temperature.
+            prompt (str): The rendered prompt.
+            image_hashes (List[str], optional): Content hashes of the images sent with the prompt.
+
+        Returns:
+            str: The key, or None if responses at this temperature must not be cached.
+        """
+        if temperature is not None and temperature > self.max_temperature:
+            return None
+        payload = json.dumps([model_name, temperature, prompt, list(image_hashes)])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict: The entry with `raw` and `parsed` keys, or None if not cached.
+        """
+        if key is None:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT raw, parsed FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+        except Exception as e:
+            logging.exception(e)
+            return None
+        metrics.count(
+            "response_cache_hits" if row is not None else "response_cache_misses"
+        )
+        return dict(row) if row is not None else None
+
+    def put(self, key, model_name, raw, parsed):
+        """
+        Store a response and evict the least recently used ones beyond the size budget.
+
+        Args:
+            key (str): The cache key.
+            model_name (str): Name of the model.
+            raw (str): The raw model output.
+            parsed (str): The parsed output serialized as JSON.
+        """
+        if key is None:
+            return
+        size = len(raw.encode()) + len(parsed.encode())
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model_name, raw, parsed, size, time.time()),
+                )
+                self._evict(conn, self.max_bytes)
+        except Exception as e:
+            logging.exception(e)
+
+
+class ResultCache(SQLiteCache):
+    """
+    Persistent cache of pickled pipeline results, backing the result store.
+
+    Entries are keyed by a hash of the result store key, which includes what
+    the result was computed from and the pipeline version. The least recently
+    used entries are evicted once the cache grows beyond `max_bytes`.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            result BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """
+    TABLE = "results"
+
+    def __init__(self, path=None, max_bytes=constants.RESULT_CACHE_MAX_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+            path (str, optional): Path of the SQLite database. Defaults to `results.db` in the cache directory.
+            max_bytes (int, optional): Maximum total size of the cached results.
+        """
+        super().__init__(path or os.path.join(constants.CACHE_DIR, "results.db"))
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            bytes: The pickled result, or None if not cached.
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT result FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE results SET accessed_at = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+        except Exception as e:
+            logging.exception(e)
+            return None
+        return row["result"] if row is not None else None
+
+    def put(self, key, kind, result):
+        """
+        Store a result and evict the least recently used ones beyond the size budget.
+
+        Args:
+            key (str): The cache key.
+            kind (str): Kind of result, e.g. "overview".
+            result (bytes): The pickled result.
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, result, len(result), time.time()),
+                )
+                self._evict(conn, self.max_bytes)
+        except Exception as e:
+            logging.exception(e)
+
+    def delete(self, key):
+        """
+        Delete a result.
+
+        Args:
+            key (str): The cache key.
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        except Exception as e:
+            logging.exception(e)
+
+
+fetch_cache = FetchCache()
+response_cache = ResponseCache()
+result_cache = ResultCache()
@@ -0,0 +1,269 @@
+"""
+Headless batch runner for the review pipeline.
+
+Reads review URLs from a file, generates the overview and benchmark data of
+every URL in parallel and the overall summary of all of them. Results are
+written as soon as each URL finishes, and finished URLs are skipped when the
+run is started again, so a crash or exhausted quota only costs the URLs in
+flight.
+
+The input file has one URL per line, either as plain text or as a JSON object
+such as `{"url": "...", "images": ["screenshot.png"]}`. Screenshots are only
+needed for non-YouTube reviews.
+
+URLs whose overview failed or whose images were partly dropped, e.g. after
+an exhausted quota, are recorded as "failed" or "partial" and processed again
+by the next run. Responses of the images that succeeded are cached, so only
+the dropped ones call the model again.
+
+Output directory:
+    results.jsonl        One record per finished URL, also used to resume
+    reviews/<id>.csv     Overview and benchmark data of every review
+    summary.csv          Overall summary of the finished reviews
+
+Usage:
+    python src/cli.py urls.jsonl --output results --workers 4
+"""
+
+import constants
+import entities
+from logger import logging, log_context
+
+import argparse
+import json
+import os
+import threading
+from io import BytesIO
+from datetime import datetime
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+RESULTS_FILE = "results.jsonl"
+SUMMARY_FILE = "summary.csv"
+
+
+def read_inputs(path):
+    """
+    Read the review URLs of a batch.
+
+    Args:
+        path (str): Path of the input file.
+
+    Returns:
+        List[dict]: Entries with a `url` key and an optional `images` key, without duplicate URLs.
+    """
+    entries = {}
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"url": line}
+            entries.setdefault(entry["url"], entry)
+    return list(entries.values())
+
+
+def read_checkpoint(path):
+    """
+    Read the records of the URLs finished by previous runs.
+
+    Args:
+        path (str): Path of the results file.
+
+    Returns:
+        dict: Latest record by URL.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of a run that was killed while writing
+                continue
+            records[record["url"]] = record
+    return records
+
+
+class BatchRunner:
+    def __init__(self, output_dir, capture_backend, benchmarks=True):
+        """
+        Initialize the batch runner.
+
+        Args:
+        output_dir (str): Directory of the results.
+        capture_backend (str): How YouTube images are captured, see entities.Review.
+        benchmarks (bool): Whether to generate benchmark data.
+        """
+        self.output_dir = output_dir
+        self.capture_backend = capture_backend
+        self.benchmarks = benchmarks
+        self.results_path = os.path.join(output_dir, RESULTS_FILE)
+        self.reviews_dir = os.path.join(output_dir, "reviews")
+        self._lock = threading.Lock()
+        os.makedirs(self.reviews_dir, exist_ok=True)
+
+    def write_record(self, record):
+        """
+        Append the record of a finished URL to the results file.
+
+        Args:
+        record (dict): The record.
+        """
+        with self._lock, open(self.results_path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def run_review(self, entry):
+        """
+        Generate the overview and benchmark data of a URL and record the result.
+
+        Args:
+        entry (dict): The input entry.
+
+        Returns:
+        dict: The record.
+        """
+        url = entry["url"]
+        record = {"url": url, "status": "done"}
+        try:
+            review = entities.Reviews.get_overview(url)
+            review.capture_backend = self.capture_backend
+            with log_context(review_id=review.review_id):
+                images = None
+                if entry.get("images"):
+                    images = []
+                    for image_path in entry["images"]:
+                        with open(image_path, "rb") as file:
+                            images.append(BytesIO(file.read()))
+                if self.benchmarks and (review.is_youtube or images):
+                    review.set_benchmark_data(images=images)
+
+                csv_path = os.path.join(self.reviews_dir, f"{review.review_id}.csv")
+                with open(csv_path, "w") as file:
+                    file.write(review.download_csv())
+            record.update(
+                review_id=review.review_id,
+                website=review.website_name,
+                title=review.title,
+                author=review.author,
+                summary=review.summary,
+                benchmarks=(
+                    len(review.benchmarks) if review.benchmarks is not None else None
+                ),
+                failed_images=review.failed_images,
+                csv=os.path.relpath(csv_path, self.output_dir),
+            )
+            if not review.summary:
+                record.update(status="failed", error="No summary generated")
+            elif review.failed_images:
+                # Not finished, so that the next run retries the dropped images
+                record.update(
+                    status="partial",
+                    error=f"Dropped {review.failed_images} images after failed model calls",
+                )
+        except Exception as e:
+            logging.exception(e)
+            record.update(status="failed", error=str(e) or repr(e))
+        record["finished_at"] = datetime.now().isoformat()
+        self.write_record(record)
+        return record
+
+    def run(self, entries, max_workers=constants.MAX_WORKERS):
+        """
+        Process the URLs not finished by previous runs, including failed and partial ones.
+
+        Args:
+        entries (List[dict]): The input entries.
+        max_workers (int): Number of URLs processed in parallel.
+
+        Returns:
+        List[str]: URLs finished in this or previous runs, in input order.
+        """
+        finished = {
+            url
+            for url, record in read_checkpoint(self.results_path).items()
+            if record["status"] == "done"
+        }
+        pending = [entry for entry in entries if entry["url"] not in finished]
+        msg = f"Skipping {len(entries) - len(pending)} finished urls, processing {len(pending)}"
+        print(msg)
+        logging.info(msg)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.run_review, entry) for entry in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                if record["status"] == "done":
+                    finished.add(record["url"])
+                msg = f"[{done}/{len(pending)}] {record['status']}: {record['url']}"
+                print(msg)
+                logging.info(msg)
+
+        return [entry["url"] for entry in entries if entry["url"] in finished]
+
+    def run_summary(self, urls):
+        """
+        Generate the overall summary of the finished URLs.
+
+        The overviews are reused from the result store, so only the summary
+        itself is generated.
+
+        Args:
+        urls (List[str]): The URLs.
+        """
+        reviews = entities.Reviews(urls)
+        reviews.set_summary()
+        with open(os.path.join(self.output_dir, SUMMARY_FILE), "w") as file:
+            file.write(reviews.download_csv())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="File with one URL or JSON object per line.")
+    parser.add_argument("--output", default="results", help="Directory of the results.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=constants.MAX_WORKERS,
+        help="Number of URLs processed in parallel.",
+    )
+    parser.add_argument(
+        "--capture-backend",
+        choices=constants.CAPTURE_BACKENDS,
+        default=constants.CAPTURE_BACKEND,
+        help="How YouTube images are captured.",
+    )
+    parser.add_argument(
+        "--no-benchmarks",
+        action="store_true",
+        help="Only generate overviews.",
+    )
+    parser.add_argument(
+        "--no-summary",
+        action="store_true",
+        help="Do not generate the overall summary.",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("GOOGLE_API_KEY"):
+        parser.error("The GOOGLE_API_KEY environment variable is not set.")
+
+    entries = read_inputs(args.input)
+    runner = BatchRunner(args.output, args.capture_backend, not args.no_benchmarks)
+    urls = runner.run(entries, max_workers=args.workers)
+    failed = len(entries) - len(urls)
+    if urls and not args.no_summary:
+        runner.run_summary(urls)
+    print(f"Finished {len(urls)} of {len(entries)} urls, {failed} failed or partial")
+    if failed:
+        # Run again to retry the failed and partial urls
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
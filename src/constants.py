@@ -1,2 +1,140 @@
 DATA_DIR = "data"
 CONTENT_FILE = "content.txt"
+
+# Concurrency settings for batch processing of reviews
+MAX_WORKERS = 4  # Number of reviews processed in parallel
+OVERVIEW_TIMEOUT = 600  # Seconds to wait for a single review overview
+
+# On-disk caches
+CACHE_DIR = "cache"
+FETCH_CACHE_TTL = 24 * 60 * 60  # Seconds before a cached fetch is revalidated
+EMBEDDING_CACHE_DIR = "embeddings"  # Relative to CACHE_DIR
+FAISS_CACHE_DIR = "faiss"  # Relative to CACHE_DIR
+LLM_CACHE_MAX_BYTES = 100 * 1024 * 1024  # Size budget of cached model responses
+# Responses at higher temperatures are not cached. CHAT_TEMPERATURE and
+# VISION_TEMPERATURE are within it, so every current model call is cached.
+LLM_CACHE_MAX_TEMPERATURE = 0.3
+
+# Models
+EMBEDDING_MODEL = "models/embedding-001"
+CHAT_MODEL = "gemini-pro"
+CHAT_TEMPERATURE = 0.3
+VISION_MODEL = "models/gemini-pro-vision"
+VISION_TEMPERATURE = 0
+
+# Retrieval settings for review overviews
+CHUNK_SIZE = 400  # Tokens per chunk
+CHUNK_OVERLAP = 50  # Tokens shared by consecutive chunks
+CONTEXT_TOP_K = 20  # Number of chunks retrieved per query
+CONTEXT_TOKEN_BUDGET = 2000  # Maximum tokens of context passed to the model
+CHARS_PER_TOKEN = 4  # Approximation used to count tokens without a remote call
+COMBINED_OVERVIEW = True  # Generate website title, author and summary in one call
+SUMMARY_MODES = ["map_reduce", "retrieval"]
+SUMMARY_MODE = "map_reduce"  # "retrieval" only summarizes the top ranked reviews
+SUMMARY_BATCH_TOKENS = 3000  # Maximum tokens of review summaries per model call
+SUMMARY_WORKERS = 4  # Number of batches summarized in parallel
+SUMMARY_BATCH_BOUNDARY = 4  # Average summaries per batch, see genai.batch_texts
+
+# Screenshot capture of YouTube videos
+CAPTURE_BACKENDS = ["browser", "video"]
+CAPTURE_BACKEND = "browser"  # Play in headless Chrome or decode a downloaded video
+VIDEO_FILE = "video.mp4"
+BROWSER_POOL_SIZE = 2  # Maximum headless browsers alive at once
+BROWSER_MAX_USES = 10  # Captures after which a browser is replaced
+BROWSER_WARM = 1  # Browsers launched when the app starts
+CAPTURE_SHARDS = 2  # Browsers capturing a single video in parallel
+VIDEO_CAPTURE_SHARDS = 4  # Decoders capturing a single video file in parallel
+CAPTURE_SKIP = 60  # Seconds skipped at the start of the video
+CAPTURE_INTERVAL = 10  # Seconds between captures when no transcript is available
+TRANSCRIPT_GUIDED_CAPTURE = True  # Capture around segments mentioning benchmarks
+DENSE_CAPTURE_INTERVAL = 3  # Seconds between captures around benchmark segments
+SPARSE_CAPTURE_INTERVAL = 60  # Seconds between captures elsewhere, 0 to disable
+CAPTURE_WINDOW_BEFORE = 5  # Seconds captured before a benchmark segment
+CAPTURE_WINDOW_AFTER = 20  # Seconds captured after a benchmark segment
+MIN_SEGMENT_SCORE = 1  # Keyword matches needed for a segment to be captured
+# Specific terms only, as common words such as "score" or "results" match most segments
+BENCHMARK_KEYWORDS = [
+    "benchmark",
+    "benchmarks",
+    "Cinebench",
+    "Geekbench",
+    "PCMark",
+    "3DMark",
+    "Time Spy",
+    "GFXBench",
+    "Procyon",
+    "CrossMark",
+    "Handbrake",
+    "FPS",
+    "frames per second",
+    "battery life",
+    "single-core",
+    "multi-core",
+]
+
+# Benchmark data extraction
+BENCHMARK_BATCH_SIZE = 8  # Maximum images per vision model call
+IMAGE_HASH_THRESHOLD = 5  # Max differing bits (of 64) for images to be duplicates
+VISION_WORKERS = 4  # Number of vision model calls in flight at once
+VISION_REQUESTS_PER_MINUTE = 60  # Gemini Pro Vision quota
+VISION_BURST = 4  # Requests allowed at once before rate limiting kicks in
+
+# Retry settings for transient model errors
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1  # Seconds
+RETRY_MAX_DELAY = 30  # Seconds
+
+# Product name normalization in benchmark tables
+# Words ignored when comparing product names
+PRODUCT_FILLER_WORDS = [
+    "intel",
+    "amd",
+    "apple",
+    "qualcomm",
+    "nvidia",
+    "core",
+    "processor",
+    "cpu",
+]
+PRODUCT_MATCH_CUTOFF = 0.9  # Minimum similarity for fuzzy matched product names
+PRODUCT_ALIASES = {
+    "Core Ultra 7 155H": ["Intel Core Ultra 7 155H", "Ultra 7 155H"],
+    "Core Ultra 9 185H": ["Intel Core Ultra 9 185H", "Ultra 9 185H"],
+    "Core Ultra 5 125H": ["Intel Core Ultra 5 125H", "Ultra 5 125H"],
+    "Ryzen 7 7840U": ["AMD Ryzen 7 7840U", "R7 7840U"],
+    "Ryzen 7 7840HS": ["AMD Ryzen 7 7840HS", "R7 7840HS"],
+    "M3": ["Apple M3"],
+    "M2": ["Apple M2"],
+}
+
+# Background jobs
+JOB_WORKERS = 4  # Number of jobs running at once across all sessions
+JOB_POLL_INTERVAL = 2  # Seconds between UI refreshes while jobs are running
+JOB_MAX_AGE = 7 * 24 * 60 * 60  # Seconds finished jobs and their results are kept
+
+# Metrics
+METRICS_FILE = "metrics/query_reviews.prom"  # Prometheus text file, empty to disable
+METRICS_PORT = 9100  # Port of the Prometheus /metrics endpoint, 0 to disable
+
+# Logging
+LOG_DIR = "logs"
+LOG_FILE = "query_reviews.log"
+LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log file beyond this size, 0 to disable
+LOG_ROTATE_WHEN = "midnight"  # Time based rotation, see TimedRotatingFileHandler
+LOG_BACKUP_COUNT = 7  # Number of rotated log files kept
+LOG_QUEUE_SIZE = 10000  # Records waiting to be written, newer ones are dropped
+LOG_MAX_MESSAGE_CHARS = 2000  # Truncate longer messages (e.g. model outputs)
+
+# Shared results
+# Bump to recompute stored results when prompts or models change, and when
+# stored classes such as Review change, as older pickles lack new attributes
+PIPELINE_VERSION = "2"
+RESULT_STORE_MAX_BYTES = 200 * 1024 * 1024  # Memory budget of shared results
+RESULT_CACHE_MAX_BYTES = 500 * 1024 * 1024  # Size budget of results kept on disk
+
+# Workspaces
+WORKSPACE_MAX_AGE = 24 * 60 * 60  # Seconds a workspace is kept after its last use
+WORKSPACE_MAX_BYTES = 5 * 1024 * 1024 * 1024  # Disk budget of all workspaces
+WORKSPACE_LEASE_TTL = 60 * 60  # Seconds a workspace is protected after its last use
+WORKSPACE_GC_INTERVAL = 10 * 60  # Seconds between garbage collections
@@ -1,24 +1,42 @@
 import utils
 import constants
 import genai
-from logger import logging
+import metrics
+from store import result_store
+from logger import logging, log_context
+from workspace import workspace_manager
 
-import os
 import csv
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from io import StringIO
 import pandas as pd
 import textwrap
 
 
 class Review:
-    def __init__(self, url: str):
+    def __init__(
+        self,
+        url: str,
+        capture_backend: str = constants.CAPTURE_BACKEND,
+        video_path: str = None,
+    ):
         """
         Initialize Review object with the provided URL.
 
         Args:
         url (str): The URL of the review.
+        capture_backend (str): How YouTube images are captured, "browser" to play the video in headless Chrome or "video" to decode frames from a video file.
+        video_path (str): Local video file used by the "video" backend. The video is downloaded if not provided.
         """
+        if capture_backend not in constants.CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend: {capture_backend}")
         self.url: str = url
+        self.review_id: str = utils.get_review_id(url)
+        self.capture_backend: str = capture_backend
+        self.video_path: str = video_path
         self.is_youtube: bool = None
         self.website_name: str = None
         self.title: str = None
@@ -26,6 +44,8 @@ class Review:
         self.dir_path: str = None
         self.summary: str = None
         self.benchmarks: pd.DataFrame = None
+        self.failed_images: int = None
+        self.trace: dict = metrics.new_trace()
 
     def set_overview(self):
         """
@@ -36,41 +56,42 @@ class Review:
 
         self.is_youtube = utils.is_youtube_link(self.url)
 
-        msg = f"Generating overview for {self.url}"
-        print(msg)
-        logging.info(msg)
-
-        if self.is_youtube:
-            self.website_name, self.title = utils.collect_youtube_metadata(url=self.url)
-            self.author = (
-                self.website_name
-            )  # Author is same as Channel name (Website name)
-            if self.website_name:
-                self.dir_path = os.path.join(
-                    constants.DATA_DIR, self.website_name.replace(" ", "")
-                )
-                utils.collect_youtube_content(url=self.url, dir_path=self.dir_path)
-                _, generated_summary = genai.generate_overview(
-                    dir_path=self.dir_path, generate_metadata=False
-                )
-                if generated_summary:
-                    self.summary = generated_summary.summary
+        with log_context(review_id=self.review_id), metrics.trace(
+            self.trace
+        ), metrics.stage("review_overview"):
+            msg = f"Generating overview for {self.url}"
+            print(msg)
+            logging.info(msg)
 
-        else:
-            self.website_name = utils.collect_website_metadata(url=self.url)
-            if self.website_name:
-                self.dir_path = os.path.join(
-                    constants.DATA_DIR, self.website_name.replace(" ", "")
+            if self.is_youtube:
+                self.website_name, self.title = utils.collect_youtube_metadata(
+                    url=self.url
                 )
-                utils.collect_website_content(url=self.url, dir_path=self.dir_path)
-                generated_metadata, generated_summary = genai.generate_overview(
-                    dir_path=self.dir_path, generate_metadata=True
-                )
-                if generated_metadata:
-                    self.title = generated_metadata.title
-                    self.author = generated_metadata.author
-                if generated_summary:
-                    self.summary = generated_summary.summary
+                self.author = (
+                    self.website_name
+                )  # Author is same as Channel name (Website name)
+                if self.website_name:
+                    self.dir_path = workspace_manager.create(self.review_id)
+                    utils.collect_youtube_content(url=self.url, dir_path=self.dir_path)
+                    _, generated_summary = genai.generate_overview(
+                        dir_path=self.dir_path, generate_metadata=False
+                    )
+                    if generated_summary:
+                        self.summary = generated_summary.summary
+
+            else:
+                self.website_name = utils.collect_website_metadata(url=self.url)
+                if self.website_name:
+                    self.dir_path = workspace_manager.create(self.review_id)
+                    utils.collect_website_content(url=self.url, dir_path=self.dir_path)
+                    generated_metadata, generated_summary = genai.generate_overview(
+                        dir_path=self.dir_path, generate_metadata=True
+                    )
+                    if generated_metadata:
+                        self.title = generated_metadata.title
+                        self.author = generated_metadata.author
+                    if generated_summary:
+                        self.summary = generated_summary.summary
 
         msg = f"Done generating overview for {self.url}"
         print(msg)
@@ -83,22 +104,73 @@ class Review:
         Args:
         images (list): List of image paths.
         """
-        msg = f"Generating benchmark data for {self.url}"
-        print(msg)
-        logging.info(msg)
+        for _ in self.iter_benchmark_data(images=images):
+            pass
 
-        images_path = None
-        if self.is_youtube:
-            images_path = utils.collect_youtube_images(
-                url=self.url, dir_path=self.dir_path
-            )
-        else:
-            images_path = utils.collect_website_images(
-                images=images, dir_path=self.dir_path
-            )
+    def iter_benchmark_data(self, images=None):
+        """
+        Set benchmark data of the review, yielding partial results as images are processed.
 
-        generated_benchmarks = genai.generate_benchmark_data(images_path=images_path)
-        self.benchmarks = utils.get_benchmarks_df(benchmarks=generated_benchmarks)
+        The benchmarks attribute is only set once all images are processed,
+        along with the number of images dropped after failed model calls.
+
+        Args:
+        images (list): List of image paths.
+
+        Yields:
+        tuple: Number of images processed so far, total number of images and DataFrame of the benchmarks generated so far.
+        """
+        # Capture into a workspace of this run, so that concurrent runs do not collide
+        self.dir_path = workspace_manager.create(self.review_id)
+        with log_context(review_id=self.review_id), metrics.trace(
+            self.trace
+        ), metrics.stage("review_benchmarks"), workspace_manager.acquire(self.dir_path):
+            msg = f"Generating benchmark data for {self.url}"
+            print(msg)
+            logging.info(msg)
+
+            images_path = None
+            if self.is_youtube and self.capture_backend == "video":
+                # Downloads are shared by all runs of the review
+                video_path = self.video_path or utils.download_youtube_video(
+                    url=self.url,
+                    dir_path=workspace_manager.create(self.review_id, run="video"),
+                )
+                images_path = utils.collect_video_images(
+                    video_path=video_path, dir_path=self.dir_path, url=self.url
+                )
+            elif self.is_youtube:
+                images_path = utils.collect_youtube_images(
+                    url=self.url, dir_path=self.dir_path
+                )
+            else:
+                images_path = utils.collect_website_images(
+                    images=images, dir_path=self.dir_path
+                )
+
+            removed = utils.dedupe_images(images_path=images_path)
+            msg = f"Removed {removed} duplicate images for {self.url}"
+            print(msg)
+            logging.info(msg)
+
+            # Batches complete in any order, keep them by index to restore image order
+            batch_benchmarks = {}
+            processed = 0
+            for index, benchmarks, processed, total in genai.iter_benchmark_data(
+                images_path=images_path
+            ):
+                batch_benchmarks[index] = benchmarks
+                yield processed, total, utils.get_benchmarks_df(
+                    benchmarks=genai.join_benchmark_batches(batch_benchmarks)
+                )
+            generated_benchmarks = genai.join_benchmark_batches(batch_benchmarks)
+            self.benchmarks = utils.get_benchmarks_df(benchmarks=generated_benchmarks)
+            # Batches return one benchmark per image unless images were dropped
+            self.failed_images = processed - len(generated_benchmarks)
+            if self.failed_images:
+                logging.warning(
+                    f"Dropped {self.failed_images} of {processed} images for {self.url}"
+                )
 
         msg = f"Done generating benchmark data for {self.url}"
         print(msg)
@@ -134,20 +206,33 @@ class Review:
 
 
 class Reviews:
-    def __init__(self, urls: str):
+    def __init__(
+        self,
+        urls: str,
+        max_workers: int = constants.MAX_WORKERS,
+        timeout: float = constants.OVERVIEW_TIMEOUT,
+    ):
         """
         Initialize Reviews object with the provided URLs.
 
         Args:
         urls (list): List of review URLs.
+        max_workers (int): Number of reviews processed in parallel.
+        timeout (float): Seconds a single review overview may take, from when it starts.
         """
         self.urls = urls
+        self.max_workers = max_workers
+        self.timeout = timeout
         self.overview: pd.DataFrame = None
         self.summary: str = None
+        self.trace: dict = metrics.new_trace()
 
-    def set_summary(self):
+    def set_summary(self, progress=None):
         """
         Set summary attributes of the reviews.
+
+        Args:
+        progress (Callable): Called with the number of finished overviews and the number of URLs whenever an overview finishes. An exception it raises, e.g. when the job is cancelled, stops the summary.
         """
         if not self.urls:
             return
@@ -159,9 +244,7 @@ class Reviews:
         data = []
         columns = ["Website", "Link", "Title", "Author", "Summary"]
         summaries = []
-        for url in self.urls:
-            review = Review(url)
-            review.set_overview()
+        for review in self._get_overviews(progress):
             data.append(
                 [
                     review.website_name,
@@ -174,10 +257,112 @@ class Reviews:
             summaries.append(review.summary)
         self.overview = pd.DataFrame(data, columns=columns)
 
-        generated_summary = genai.generate_overall_summary(summaries)
+        with metrics.trace(self.trace):
+            generated_summary = genai.generate_overall_summary(summaries)
         if generated_summary:
             self.summary = generated_summary.summary
 
+    def _get_overviews(self, progress=None):
+        """
+        Generate the overview of every URL in parallel.
+
+        At most `max_workers` reviews run at once. A review that does not
+        finish within the timeout, counted from when it started, is returned
+        without its overview. Python threads cannot be stopped, so a timed out
+        review keeps running in the background, but it frees its slot so that
+        the remaining URLs still start.
+
+        Args:
+        progress (Callable): Called with the number of finished overviews and the number of URLs whenever an overview finishes.
+
+        Returns:
+        list: List of Review objects in the same order as the URLs.
+        """
+        reviews = [None] * len(self.urls)
+        pending = deque(range(len(self.urls)))
+        running = {}  # future -> (index, deadline)
+
+        while pending or running:
+            while pending and len(running) < self.max_workers:
+                index = pending.popleft()
+                future = self._start_overview(self.urls[index])
+                running[future] = (index, time.monotonic() + self.timeout)
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            wait(
+                running,
+                timeout=max(0, next_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED,
+            )
+            now = time.monotonic()
+            for future, (index, deadline) in list(running.items()):
+                url = self.urls[index]
+                if future.done():
+                    try:
+                        reviews[index] = future.result()
+                    except Exception as e:
+                        logging.exception(e)
+                        reviews[index] = Review(url)
+                elif now >= deadline:
+                    logging.error(f"Timed out generating overview for {url}")
+                    reviews[index] = Review(url)
+                else:
+                    continue
+                del running[future]
+                if progress is not None:
+                    progress(
+                        len(self.urls) - len(pending) - len(running), len(self.urls)
+                    )
+        return reviews
+
+    def _start_overview(self, url):
+        """
+        Start generating the overview of a URL in a background thread.
+
+        Args:
+        url (str): The URL of the review.
+
+        Returns:
+        Future: Future of the Review object.
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.get_overview(url))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=metrics.bind(run), daemon=True).start()
+        return future
+
+    @staticmethod
+    def get_overview(url):
+        """
+        Generate the overview of a single URL, reusing the stored overview if its content has not changed.
+
+        Overviews are shared through the result store, so the app, the overall
+        summary and batch runs reuse each other's overviews.
+
+        Args:
+        url (str): The URL of the review.
+
+        Returns:
+        Review: Review object with overview attributes set.
+        """
+        content_hash = utils.get_content_hash(url)
+
+        def compute():
+            review = Review(url)
+            review.set_overview()
+            return review
+
+        return result_store.get_or_compute(
+            result_store.make_key("overview", url, content_hash),
+            compute,
+            should_store=lambda review: content_hash and review.summary,
+        )
+
     def download_csv(self):
         """
         Download reviews summary data as CSV.
@@ -1,7 +1,17 @@
 # Importing necessary modules and classes
+import constants
+import metrics
 import prompts
+from cache import response_cache
 from logger import logging
+from throttle import RateLimiter, call_with_retry
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
 from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydantic import BaseModel, Field
 from llama_index import SimpleDirectoryReader
 from llama_index.multi_modal_llms import GeminiMultiModal
@@ -13,7 +23,11 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.storage import LocalFileStore
 from langchain_community.vectorstores import FAISS
+from google.api_core import exceptions as google_exceptions
 
 
 # Defining data models for generated output
@@ -28,6 +42,14 @@ class GeneratedSummary(BaseModel):
     )
 
 
+class GeneratedOverview(BaseModel):
+    title: str = Field(..., description="Title of the website", required=False)
+    author: str = Field(..., description="Author of the website", required=False)
+    summary: str = Field(
+        ..., description="Summary of the website content", required=False
+    )
+
+
 class GeneratedProduct(BaseModel):
     name: str = Field(..., description="Name of the product")
     score: int = Field(
@@ -45,13 +67,272 @@ class GeneratedBenchmark(BaseModel):
     )
 
 
-def generate_overview(dir_path, generate_metadata=False):
+class GeneratedBenchmarks(BaseModel):
+    benchmarks: List[GeneratedBenchmark] = Field(
+        ..., description="List of benchmark data, one per image in the given order"
+    )
+
+
+# Process-wide registry of model clients, built once on first use
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(key, factory):
+    """
+    Get a shared model client, building it on first use.
+
+    Args:
+        key (tuple): Key identifying the client and its configuration.
+        factory (Callable): Function building the client.
+
+    Returns:
+        Any: The shared client.
+    """
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def get_embeddings(model_name=constants.EMBEDDING_MODEL):
+    """
+    Get an embedding model backed by a persistent per-text embedding cache.
+
+    Embeddings are stored on disk keyed by the hash of each text and the model
+    name, so only texts that were never embedded before hit the remote API.
+
+    Args:
+        model_name (str, optional): Name of the embedding model.
+
+    Returns:
+        CacheBackedEmbeddings: The cache backed embedding model.
+    """
+
+    def factory():
+        store = LocalFileStore(
+            os.path.join(constants.CACHE_DIR, constants.EMBEDDING_CACHE_DIR)
+        )
+        return CacheBackedEmbeddings.from_bytes_store(
+            GoogleGenerativeAIEmbeddings(model=model_name),
+            store,
+            namespace=model_name,
+        )
+
+    return _get_client(("embeddings", model_name), factory)
+
+
+def get_chat_model(
+    model_name=constants.CHAT_MODEL, temperature=constants.CHAT_TEMPERATURE
+):
+    """
+    Get the shared chat model for the given configuration.
+
+    Args:
+        model_name (str, optional): Name of the chat model.
+        temperature (float, optional): Sampling temperature.
+
+    Returns:
+        ChatGoogleGenerativeAI: The chat model.
+    """
+    return _get_client(
+        ("chat", model_name, temperature),
+        lambda: ChatGoogleGenerativeAI(model=model_name, temperature=temperature),
+    )
+
+
+def get_vision_model(
+    model_name=constants.VISION_MODEL, temperature=constants.VISION_TEMPERATURE
+):
+    """
+    Get the shared vision model for the given configuration.
+
+    Args:
+        model_name (str, optional): Name of the vision model.
+        temperature (float, optional): Sampling temperature.
+
+    Returns:
+        GeminiMultiModal: The vision model.
+    """
+    return _get_client(
+        ("vision", model_name, temperature),
+        lambda: GeminiMultiModal(model_name=model_name, temperature=temperature),
+    )
+
+
+@metrics.timed("embed")
+def get_vector_store(texts, embeddings, model_name=constants.EMBEDDING_MODEL):
+    """
+    Get a FAISS vector store for the texts, reusing a saved index when the texts have not changed.
+
+    Args:
+        texts (List[str]): Texts to index.
+        embeddings (Embeddings): Embedding model used to embed the texts.
+        model_name (str, optional): Name of the embedding model, part of the index key.
+
+    Returns:
+        FAISS: The vector store.
+    """
+    content_hash = hashlib.sha256(model_name.encode())
+    for text in texts:
+        content_hash.update(hashlib.sha256(text.encode()).digest())
+    faiss_dir = os.path.join(constants.CACHE_DIR, constants.FAISS_CACHE_DIR)
+    index_path = os.path.join(faiss_dir, content_hash.hexdigest())
+
+    if os.path.exists(index_path):
+        try:
+            vector_store = FAISS.load_local(index_path, embeddings)
+            metrics.count("faiss_cache_hits")
+            return vector_store
+        except Exception as e:
+            logging.exception(e)
+
+    metrics.count("faiss_cache_misses")
+    vector_store = FAISS.from_texts(texts, embedding=embeddings)
+    try:
+        # Save to a temporary directory first so readers never see a partial index
+        os.makedirs(faiss_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=faiss_dir)
+        vector_store.save_local(tmp_path)
+        try:
+            os.rename(tmp_path, index_path)
+        except OSError:
+            # Another caller saved the same index first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    except Exception as e:
+        logging.exception(e)
+    return vector_store
+
+
+def count_tokens(text):
+    """
+    Approximate the number of tokens in a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: Approximate number of tokens.
+    """
+    return -(-len(text) // constants.CHARS_PER_TOKEN)
+
+
+def split_texts(
+    texts, chunk_size=constants.CHUNK_SIZE, chunk_overlap=constants.CHUNK_OVERLAP
+):
+    """
+    Split texts into overlapping chunks of bounded token size.
+
+    Args:
+        texts (List[str]): Texts to split.
+        chunk_size (int, optional): Maximum tokens per chunk.
+        chunk_overlap (int, optional): Tokens shared by consecutive chunks.
+
+    Returns:
+        List[str]: The chunks.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=count_tokens,
+    )
+    chunks = []
+    for text in texts:
+        chunks.extend(text_splitter.split_text(text))
+    return chunks
+
+
+@metrics.timed("retrieve")
+def assemble_context(
+    vector_store,
+    query,
+    k=constants.CONTEXT_TOP_K,
+    token_budget=constants.CONTEXT_TOKEN_BUDGET,
+):
+    """
+    Build the prompt context from the top ranked chunks within a token budget.
+
+    Args:
+        vector_store (FAISS): Vector store to search.
+        query (str): The query.
+        k (int, optional): Number of chunks to retrieve.
+        token_budget (int, optional): Maximum number of context tokens.
+
+    Returns:
+        str: The context.
+    """
+    context_chunks = []
+    tokens = 0
+    for document in vector_store.similarity_search(query, k=k):
+        chunk_tokens = count_tokens(document.page_content)
+        if tokens + chunk_tokens > token_budget:
+            # Skip chunks that do not fit, a smaller one further down may still fit
+            continue
+        context_chunks.append(document.page_content)
+        tokens += chunk_tokens
+    return "\n\n".join(context_chunks)
+
+
+def generate_output(model, pydantic_object, template, question, context):
+    """
+    Prompt the chat model and parse its JSON output.
+
+    Args:
+        model (ChatGoogleGenerativeAI): The chat model.
+        pydantic_object (Type[BaseModel]): Data model of the expected output.
+        template (str): Prompt template with context, question and format_instructions fields.
+        question (str): The question.
+        context (str | List[Document]): The context retrieved for the question.
+
+    Returns:
+        BaseModel: The parsed output, or None if the model call or parsing failed.
+    """
+    pydantic_parser = PydanticOutputParser(pydantic_object=pydantic_object)
+    format_instructions = pydantic_parser.get_format_instructions()
+    prompt = ChatPromptTemplate.from_template(template=template)
+    messages = prompt.format_messages(
+        context=context,
+        question=question,
+        format_instructions=format_instructions,
+    )
+    prompt_text = "\n".join(message.content for message in messages)
+    cache_key = response_cache.make_key(model.model, model.temperature, prompt_text)
+    cached = response_cache.get(cache_key)
+    if cached:
+        try:
+            return pydantic_object.parse_raw(cached["parsed"])
+        except Exception as e:
+            logging.exception(e)
+    try:
+        with metrics.stage("llm"):
+            output = model(messages=messages)
+        metrics.count("llm_calls", model=model.model)
+        metrics.count("llm_prompt_chars", len(prompt_text), model=model.model)
+        metrics.count("llm_response_chars", len(output.content), model=model.model)
+        logging.debug("Model output:\n%s", output.content)
+        parsed = pydantic_parser.parse(output.content)
+        response_cache.put(cache_key, model.model, output.content, parsed.json())
+        return parsed
+    except Exception as e:
+        logging.exception(e)
+    return None
+
+
+@metrics.timed("generate_overview")
+def generate_overview(
+    dir_path, generate_metadata=False, combined=constants.COMBINED_OVERVIEW
+):
     """
     Generate metadata and summary for documents in a directory.
 
     Args:
         dir_path (str): Path to the directory containing documents.
         generate_metadata (bool, optional): Flag indicating whether to generate metadata. Defaults to False.
+        combined (bool, optional): Flag indicating whether to generate metadata and summary in a single model call. Falls back to separate calls if the output cannot be parsed.
 
     Returns:
         Tuple[GeneratedMetadata, GeneratedSummary]: Tuple containing generated metadata and summary.
@@ -59,132 +340,542 @@ def generate_overview(dir_path, generate_metadata=False):
     metadata, summary = None, None
 
     # Define models
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
+    embeddings = get_embeddings()
+    model = get_chat_model()
 
     try:
         # Load document vector store
         documents = SimpleDirectoryReader(dir_path).load_data()
-        nodes = [doc.text for doc in documents]
-        vector_store = FAISS.from_texts(nodes, embedding=embeddings)
+        nodes = split_texts([doc.text for doc in documents])
+        vector_store = get_vector_store(nodes, embeddings)
     except Exception as e:
         logging.exception(e)
         return metadata, summary
 
+    if generate_metadata and combined:
+        # Generate Metadata and Summary together
+        overview = generate_output(
+            model,
+            GeneratedOverview,
+            prompts.prompt_review_overview,
+            prompts.query_review_overview,
+            assemble_context(vector_store, prompts.query_review_overview),
+        )
+        if overview:
+            metadata = GeneratedMetadata(title=overview.title, author=overview.author)
+            summary = GeneratedSummary(summary=overview.summary)
+            return metadata, summary
+        logging.warning("Falling back to separate metadata and summary generation")
+
     if generate_metadata:
         # Generate Metadata
-        pydantic_parser = PydanticOutputParser(pydantic_object=GeneratedMetadata)
-        format_instructions = pydantic_parser.get_format_instructions()
-        context_vectors = vector_store.similarity_search(prompts.query_review_metadata)
-        prompt = ChatPromptTemplate.from_template(
-            template=prompts.prompt_review_metadata
-        )
-        messages = prompt.format_messages(
-            context=context_vectors,
-            question=prompts.query_review_metadata,
-            format_instructions=format_instructions,
+        metadata = generate_output(
+            model,
+            GeneratedMetadata,
+            prompts.prompt_review_metadata,
+            prompts.query_review_metadata,
+            assemble_context(vector_store, prompts.query_review_metadata),
         )
-        try:
-            output = model(messages=messages)
-            logging.info(f"Model output:\n{output.content}")
-            metadata = pydantic_parser.parse(output.content)
-        except Exception as e:
-            logging.exception(e)
 
     # Generate Summary
-    pydantic_parser = PydanticOutputParser(pydantic_object=GeneratedSummary)
-    format_instructions = pydantic_parser.get_format_instructions()
-    context_vectors = vector_store.similarity_search(prompts.query_review_summary)
-    prompt = ChatPromptTemplate.from_template(template=prompts.prompt_review_summary)
-    messages = prompt.format_messages(
-        context=context_vectors,
-        question=prompts.query_review_summary,
-        format_instructions=format_instructions,
+    summary = generate_output(
+        model,
+        GeneratedSummary,
+        prompts.prompt_review_summary,
+        prompts.query_review_summary,
+        assemble_context(vector_store, prompts.query_review_summary),
     )
+
+    return metadata, summary
+
+
+def hash_image_document(image_document):
+    """
+    Compute the content hash of an image document.
+
+    Args:
+        image_document (ImageDocument): The image document.
+
+    Returns:
+        str: The SHA-256 hex digest of the image content.
+    """
+    if image_document.image_path:
+        with open(image_document.image_path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    return hashlib.sha256((image_document.image or "").encode()).hexdigest()
+
+
+def get_benchmark_prompt(num_images):
+    """
+    Get the output data model and prompt template for a batch of images.
+
+    Args:
+        num_images (int): Number of images in the batch.
+
+    Returns:
+        Tuple[Type[BaseModel], str]: The output data model and prompt template.
+    """
+    if num_images == 1:
+        return GeneratedBenchmark, prompts.prompt_benchmark_data
+    return GeneratedBenchmarks, prompts.prompt_benchmark_data_batch
+
+
+def get_benchmark_list(response, num_images):
+    """
+    Get the benchmark data of every image from a parsed model response.
+
+    Args:
+        response (GeneratedBenchmark | GeneratedBenchmarks): The parsed response.
+        num_images (int): Number of images in the batch.
+
+    Returns:
+        List[GeneratedBenchmark]: Generated benchmark data, one per image.
+
+    Raises:
+        ValueError: If the response does not have one result per image.
+    """
+    benchmarks = [response] if num_images == 1 else response.benchmarks
+    if len(benchmarks) != num_images:
+        raise ValueError(f"Expected {num_images} benchmarks, got {len(benchmarks)}")
+    return benchmarks
+
+
+def get_cached_benchmarks(model, image_documents):
+    """
+    Look up the benchmark data of a batch of images in the response cache.
+
+    Responses are cached by the hash of the prompt and image contents, so the
+    same screenshots are only analyzed once.
+
+    Args:
+        model (GeminiMultiModal): The vision model.
+        image_documents (List[ImageDocument]): Images to analyze.
+
+    Returns:
+        Tuple[str, List[GeneratedBenchmark]]: The cache key, and the cached benchmark data or None if not cached.
+    """
+    num_images = len(image_documents)
+    output_cls, prompt_template_str = get_benchmark_prompt(num_images)
+    cache_key = response_cache.make_key(
+        model.model_name,
+        model.temperature,
+        prompt_template_str.format(num_images=num_images),
+        [hash_image_document(image_doc) for image_doc in image_documents],
+    )
+    cached = response_cache.get(cache_key)
+    if not cached:
+        return cache_key, None
     try:
-        output = model(messages=messages)
-        logging.info(f"Model output:\n{output.content}")
-        summary = pydantic_parser.parse(output.content)
+        response = output_cls.parse_raw(cached["parsed"])
+        return cache_key, get_benchmark_list(response, num_images)
     except Exception as e:
         logging.exception(e)
+        return cache_key, None
 
-    return metadata, summary
+
+def extract_benchmarks(model, image_documents, cache_key=None):
+    """
+    Extract benchmark data from a batch of images with a single model call.
+
+    The raw model output and its parsed form are stored in the response
+    cache, see get_cached_benchmarks.
+
+    Args:
+        model (GeminiMultiModal): The vision model.
+        image_documents (List[ImageDocument]): Images to analyze.
+        cache_key (str, optional): The response cache key of the batch, not cached if None.
+
+    Returns:
+        List[GeneratedBenchmark]: Generated benchmark data, one per image.
+
+    Raises:
+        ValueError: If the model does not return one result per image.
+    """
+    num_images = len(image_documents)
+    output_cls, prompt_template_str = get_benchmark_prompt(num_images)
+    prompt_text = prompt_template_str.format(num_images=num_images)
+    output_parser = LlamaIndexPydanticOutputParser(output_cls)
+    llm_program = MultiModalLLMCompletionProgram.from_defaults(
+        output_parser=output_parser,
+        image_documents=image_documents,
+        prompt_template_str=prompt_template_str,
+        multi_modal_llm=model,
+        verbose=False,
+    )
+    # Call the model as the program does, but keep the raw output for the cache
+    formatted_prompt = llm_program.prompt.format(llm=model, num_images=num_images)
+    with metrics.stage("vision"):
+        raw_output = model.complete(
+            formatted_prompt, image_documents=image_documents
+        ).text
+    metrics.count("llm_calls", model=model.model_name)
+    metrics.count("llm_prompt_chars", len(prompt_text), model=model.model_name)
+    metrics.count("llm_prompt_images", num_images, model=model.model_name)
+    metrics.count("llm_response_chars", len(raw_output), model=model.model_name)
+    logging.debug("Benchmarks: \n %s", raw_output)
+
+    response = output_parser.parse(raw_output)
+    benchmarks = get_benchmark_list(response, num_images)
+    response_cache.put(cache_key, model.model_name, raw_output, response.json())
+    return benchmarks
+
+
+# Shared across threads so that concurrent requests stay within the quota
+vision_rate_limiter = RateLimiter(
+    constants.VISION_REQUESTS_PER_MINUTE, burst=constants.VISION_BURST
+)
 
 
-def generate_benchmark_data(images_path):
+def is_transient_error(e):
+    """
+    Check if a model call failed with an error worth retrying.
+
+    Args:
+        e (Exception): The exception raised by the model call.
+
+    Returns:
+        bool: True if the error is transient (throttling, timeouts, server errors), False otherwise.
+    """
+    return isinstance(
+        e,
+        (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+            ConnectionError,
+            TimeoutError,
+        ),
+    )
+
+
+def process_benchmark_batch(model, image_documents):
+    """
+    Extract benchmark data from a batch of images, splitting the batch on failure.
+
+    Transient errors are retried with backoff, and the batch is dropped once
+    the retries are exhausted. If the batch fails otherwise (e.g. payload
+    limits or unparsable output) it is split in halves which are processed
+    separately. Images that fail on their own are dropped.
+
+    Args:
+        model (GeminiMultiModal): The vision model.
+        image_documents (List[ImageDocument]): Images to analyze.
+
+    Returns:
+        List[GeneratedBenchmark]: Generated benchmark data in image order, one per image that was not dropped.
+    """
+    # Look up the cache first, so that cached batches do not consume rate limit tokens
+    cache_key, benchmarks = get_cached_benchmarks(model, image_documents)
+    if benchmarks is not None:
+        return benchmarks
+    try:
+        return call_with_retry(
+            lambda: extract_benchmarks(model, image_documents, cache_key),
+            is_retryable=is_transient_error,
+            retries=constants.MAX_RETRIES,
+            base_delay=constants.RETRY_BASE_DELAY,
+            max_delay=constants.RETRY_MAX_DELAY,
+            rate_limiter=vision_rate_limiter,
+        )
+    except Exception as e:
+        logging.exception(e)
+        if is_transient_error(e):
+            # Splitting would only multiply the calls while the quota is exhausted
+            return []
+    if len(image_documents) == 1:
+        return []
+    mid = len(image_documents) // 2
+    return process_benchmark_batch(
+        model, image_documents[:mid]
+    ) + process_benchmark_batch(model, image_documents[mid:])
+
+
+def load_benchmark_batches(images_path, batch_size=constants.BENCHMARK_BATCH_SIZE):
+    """
+    Load the images in a directory and group them into batches.
+
+    Args:
+        images_path (str): Path to the directory containing images.
+        batch_size (int, optional): Maximum number of images per batch.
+
+    Returns:
+        List[List[ImageDocument]]: The batches in image order.
+    """
+    image_documents = SimpleDirectoryReader(images_path).load_data()
+    batch_size = max(1, batch_size)
+    return [
+        image_documents[i : i + batch_size]
+        for i in range(0, len(image_documents), batch_size)
+    ]
+
+
+def generate_benchmark_data(
+    images_path,
+    batch_size=constants.BENCHMARK_BATCH_SIZE,
+    max_workers=constants.VISION_WORKERS,
+):
     """
     Generate benchmark data for images in a directory.
 
+    Images are sent to the vision model in batches, processed concurrently by a
+    worker pool and throttled by a shared rate limiter, see iter_benchmark_data.
+
     Args:
         images_path (str): Path to the directory containing images.
+        batch_size (int, optional): Maximum number of images per model call.
+        max_workers (int, optional): Number of model calls in flight at once.
+
+    Returns:
+        List[GeneratedBenchmark]: List of generated benchmark data in image order.
+    """
+    batch_benchmarks = {}
+    for index, benchmarks, _, _ in iter_benchmark_data(
+        images_path, batch_size=batch_size, max_workers=max_workers
+    ):
+        batch_benchmarks[index] = benchmarks
+    return join_benchmark_batches(batch_benchmarks)
+
+
+def join_benchmark_batches(batch_benchmarks):
+    """
+    Join the benchmark data of batches in image order.
+
+    Args:
+        batch_benchmarks (Dict[int, List[GeneratedBenchmark]]): Benchmark data by batch index.
 
     Returns:
-        List[GeneratedBenchmark]: List of generated benchmark data.
+        List[GeneratedBenchmark]: Benchmark data of all batches in image order.
+    """
+    return [
+        benchmark
+        for index in sorted(batch_benchmarks)
+        for benchmark in batch_benchmarks[index]
+    ]
+
+
+def iter_benchmark_data(
+    images_path,
+    batch_size=constants.BENCHMARK_BATCH_SIZE,
+    max_workers=constants.VISION_WORKERS,
+):
     """
-    benchmarks = []
-    model = GeminiMultiModal(model_name="models/gemini-pro-vision", temperature=0)
+    Generate benchmark data for images in a directory, yielding results as soon as each batch is parsed.
+
+    Batches are yielded in completion order, not in image order, along with
+    their index so that callers can put the results back in image order. A
+    batch has one benchmark per image, except for the images dropped after
+    failed model calls.
+
+    Args:
+        images_path (str): Path to the directory containing images.
+        batch_size (int, optional): Maximum number of images per model call.
+        max_workers (int, optional): Number of model calls in flight at once.
+
+    Yields:
+        Tuple[int, List[GeneratedBenchmark], int, int]: Index of the completed batch, its benchmark data, number of images processed so far and total number of images.
+    """
+    model = get_vision_model()
     try:
-        image_documents = SimpleDirectoryReader(images_path).load_data()
+        batches = load_benchmark_batches(images_path, batch_size)
     except Exception as e:
         logging.exception(e)
-        return benchmarks
-    for image_doc in image_documents:
-        prompt_template_str = prompts.prompt_benchmark_data
-        try:
-            llm_program = MultiModalLLMCompletionProgram.from_defaults(
-                output_parser=LlamaIndexPydanticOutputParser(GeneratedBenchmark),
-                image_documents=[image_doc],
-                prompt_template_str=prompt_template_str,
-                multi_modal_llm=model,
-                verbose=False,
+        return
+
+    total = sum(len(batch) for batch in batches)
+    processed = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(metrics.bind(process_benchmark_batch), model, batch): index
+            for index, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            processed += len(batches[index])
+            yield index, future.result(), processed, total
+    finally:
+        # Stop pending batches if the caller stops iterating early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    Truncate a text to an approximate number of tokens.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): Maximum number of tokens.
+
+    Returns:
+        str: The truncated text.
+    """
+    return text[: max_tokens * constants.CHARS_PER_TOKEN]
+
+
+def batch_texts(
+    texts,
+    token_budget=constants.SUMMARY_BATCH_TOKENS,
+    boundary=constants.SUMMARY_BATCH_BOUNDARY,
+):
+    """
+    Group consecutive texts into batches of bounded token size.
+
+    Texts are truncated to half the budget, so that every batch holds at least
+    two texts and each reduce level at least halves the number of texts.
+
+    Batches also end after every text whose hash is divisible by `boundary`,
+    so boundaries depend on the texts rather than on their positions. When a
+    text changes or is added, usually only its own batch changes, and the
+    summaries of the other batches are served from the response cache.
+
+    Args:
+        texts (List[str]): The texts.
+        token_budget (int, optional): Maximum tokens per batch.
+        boundary (int, optional): Average number of texts per batch when within the budget, 0 to only split on the budget.
+
+    Returns:
+        List[List[str]]: The batches in text order.
+    """
+    texts = [truncate_tokens(text, token_budget // 2) for text in texts]
+    if sum(count_tokens(text) for text in texts) <= token_budget:
+        return [texts] if texts else []
+
+    batches = []
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if batch and batch_tokens + tokens > token_budget:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+        text_hash = int(hashlib.sha256(text.encode()).hexdigest(), 16)
+        if boundary and len(batch) > 1 and text_hash % boundary == 0:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def summarize_batch(model, batch, template, question):
+    """
+    Summarize a batch of summaries with a single model call.
+
+    Args:
+        model (ChatGoogleGenerativeAI): The chat model.
+        batch (List[str]): The summaries.
+        template (str): Prompt template with context, question and format_instructions fields.
+        question (str): The question.
+
+    Returns:
+        GeneratedSummary: The generated summary, or None if the model call failed.
+    """
+    context = "\n\n".join(
+        f"Review {i}:\n{summary}" for i, summary in enumerate(batch, start=1)
+    )
+    return generate_output(model, GeneratedSummary, template, question, context)
+
+
+def reduce_summaries(
+    model,
+    summaries,
+    token_budget=constants.SUMMARY_BATCH_TOKENS,
+    max_workers=constants.SUMMARY_WORKERS,
+):
+    """
+    Recursively combine summaries until they fit into a single model call.
+
+    Each level groups the summaries into token-bounded batches and summarizes
+    the batches in parallel. A batch that fails to summarize is kept as the
+    concatenation of its summaries, so that no review is dropped.
+
+    Args:
+        model (ChatGoogleGenerativeAI): The chat model.
+        summaries (List[str]): The summaries.
+        token_budget (int, optional): Maximum tokens of summaries per model call.
+        max_workers (int, optional): Number of batches summarized in parallel.
+
+    Returns:
+        List[str]: The summaries of the last level, fitting into a single batch.
+    """
+    batches = batch_texts(summaries, token_budget)
+    while len(batches) > 1:
+        with metrics.stage("summary_reduce"), ThreadPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            outputs = list(
+                executor.map(
+                    metrics.bind(
+                        lambda batch: summarize_batch(
+                            model,
+                            batch,
+                            prompts.prompt_partial_summary,
+                            prompts.query_partial_summary,
+                        )
+                    ),
+                    batches,
+                )
             )
-            response = llm_program()
-            logging.info(f"Benchmark: \n {response}")
-            benchmarks.append(response)
-        except Exception as e:
-            logging.exception(e)
-    return benchmarks
+        summaries = [
+            output.summary if output and output.summary else "\n".join(batch)
+            for batch, output in zip(batches, outputs)
+        ]
+        batches = batch_texts(summaries, token_budget)
+    return batches[0] if batches else []
 
 
-def generate_overall_summary(summaries):
+@metrics.timed("overall_summary")
+def generate_overall_summary(summaries, mode=constants.SUMMARY_MODE):
     """
     Generate an overall summary based on input summaries.
 
+    In "map_reduce" mode every summary is covered: summaries are combined in
+    token-bounded batches, recursively, before the final call. In "retrieval"
+    mode only the summaries ranked most relevant by the vector store are used.
+
     Args:
         summaries (List[str]): List of summaries.
+        mode (str, optional): "map_reduce" or "retrieval".
 
     Returns:
         GeneratedSummary: Generated overall summary.
     """
+    if mode not in constants.SUMMARY_MODES:
+        raise ValueError(f"Unknown summary mode: {mode}")
     overall_summary = None
 
-    # Remove empty summaries before embedding
-    summaries = [summary for summary in summaries if summary is not None]
+    # Remove empty summaries
+    summaries = [summary for summary in summaries if summary]
+    if not summaries:
+        return overall_summary
 
-    # Define models
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
+    model = get_chat_model()
 
+    if mode == "map_reduce":
+        return summarize_batch(
+            model,
+            reduce_summaries(model, summaries),
+            prompts.prompt_overall_summary,
+            prompts.query_overall_summary,
+        )
+
+    embeddings = get_embeddings()
     try:
-        vector_store = FAISS.from_texts(summaries, embedding=embeddings)
+        vector_store = get_vector_store(summaries, embeddings)
     except Exception as e:
         logging.exception(e)
         return overall_summary
 
-    pydantic_parser = PydanticOutputParser(pydantic_object=GeneratedSummary)
-    format_instructions = pydantic_parser.get_format_instructions()
     context_vectors = vector_store.similarity_search(prompts.query_overall_summary)
-    prompt = ChatPromptTemplate.from_template(template=prompts.prompt_overall_summary)
-    messages = prompt.format_messages(
-        context=context_vectors,
-        question=prompts.query_overall_summary,
-        format_instructions=format_instructions,
+    overall_summary = generate_output(
+        model,
+        GeneratedSummary,
+        prompts.prompt_overall_summary,
+        prompts.query_overall_summary,
+        context_vectors,
     )
-    try:
-        output = model(messages=messages)
-        logging.info(f"Model output:\n{output.content}")
-        overall_summary = pydantic_parser.parse(output.content)
-    except Exception as e:
-        logging.exception(e)
 
     return overall_summary
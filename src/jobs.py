@@ -0,0 +1,286 @@
+import constants
+from cache import SQLiteCache
+from logger import logging, log_context
+
+import os
+import time
+import uuid
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job function when the job has been cancelled.
+    """
+
+
+class Job:
+    """
+    Handle passed to a running job function to report progress and check for cancellation.
+    """
+
+    def __init__(self, manager, job_id):
+        """
+        Initialize the handle.
+
+        Args:
+            manager (JobManager): The manager running the job.
+            job_id (str): The ID of the job.
+        """
+        self.manager = manager
+        self.id = job_id
+
+    @property
+    def cancelled(self):
+        """
+        bool: True if the job has been cancelled.
+        """
+        return self.manager._is_cancelled(self.id)
+
+    def set_progress(self, progress, message=None, partial=None):
+        """
+        Report the progress of the job.
+
+        Args:
+            progress (float): Fraction of the job completed, between 0 and 1.
+            message (str, optional): Description of the current step.
+            partial (Any, optional): Partial result displayed while the job runs. Kept in memory only.
+
+        Raises:
+            JobCancelled: If the job has been cancelled.
+        """
+        if self.cancelled:
+            raise JobCancelled(self.id)
+        if partial is not None:
+            self.manager._partials[self.id] = partial
+        self.manager._update(self.id, progress=progress, message=message)
+
+
+class JobManager(SQLiteCache):
+    """
+    Runs long jobs in a bounded worker pool and tracks them in a persistent job table.
+
+    Jobs outlive the Streamlit script run and session that submitted them, so
+    their status and result can be retrieved after a rerun or reconnect. Jobs
+    that were still active when the process stopped are marked as failed, and
+    finished jobs are removed with their result after `max_age` seconds.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL,
+            message TEXT,
+            error TEXT,
+            result BLOB,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    TABLE = "jobs"
+
+    def __init__(
+        self,
+        path=None,
+        max_workers=constants.JOB_WORKERS,
+        max_age=constants.JOB_MAX_AGE,
+    ):
+        """
+        Initialize the job manager.
+
+        Args:
+            path (str, optional): Path of the SQLite database. Defaults to `jobs.db` in the cache directory.
+            max_workers (int, optional): Number of jobs running at once.
+            max_age (float, optional): Seconds finished jobs are kept.
+        """
+        super().__init__(path or os.path.join(constants.CACHE_DIR, "jobs.db"))
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures_lock = threading.Lock()
+        self._futures = {}
+        self._cancel_events = {}
+        self._partials = {}
+        self._recovered = False
+
+    def _connect(self):
+        conn = super()._connect()
+        if not self._recovered:
+            self._recovered = True
+            # Jobs of a previous process can never finish
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status IN (?, ?)",
+                (FAILED, "Interrupted by restart", time.time(), *ACTIVE_STATUSES),
+            )
+            conn.commit()
+        return conn
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        fields = {k: v for k, v in fields.items() if v is not None}
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def prune(self):
+        """
+        Remove the finished jobs older than `max_age` along with their results.
+
+        Returns:
+            int: The number of jobs removed.
+        """
+        with self._connect() as conn:
+            removed = conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+                (*ACTIVE_STATUSES, time.time() - self.max_age),
+            ).rowcount
+        if removed:
+            logging.info(f"Removed {removed} expired jobs")
+        return removed
+
+    def _is_cancelled(self, job_id):
+        event = self._cancel_events.get(job_id)
+        return event is not None and event.is_set()
+
+    def submit(self, kind, func, *args):
+        """
+        Submit a job.
+
+        Args:
+            kind (str): Kind of job, e.g. "overview".
+            func (Callable): Job function called with a Job handle followed by `args`. Its return value must be picklable.
+            *args: Arguments passed to the job function.
+
+        Returns:
+            str: The ID of the job.
+        """
+        self.prune()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, 0.0, now, now),
+            )
+        self._cancel_events[job_id] = threading.Event()
+        # Hold the lock until the future is registered, so that a job finishing
+        # right away cannot remove its entry first
+        with self._futures_lock:
+            self._futures[job_id] = self._executor.submit(self._run, job_id, func, args)
+        logging.info(f"Submitted {kind} job {job_id}")
+        return job_id
+
+    def _run(self, job_id, func, args):
+        """
+        Run a job and record its outcome.
+
+        Args:
+            job_id (str): The ID of the job.
+            func (Callable): The job function.
+            args (tuple): Arguments passed to the job function.
+        """
+        try:
+            if self._is_cancelled(job_id):
+                raise JobCancelled(job_id)
+            self._update(job_id, status=RUNNING)
+            with log_context(job_id=job_id):
+                result = func(Job(self, job_id), *args)
+            self._update(job_id, status=DONE, progress=1.0, result=pickle.dumps(result))
+            logging.info(f"Job {job_id} done")
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED)
+            logging.info(f"Job {job_id} cancelled")
+        except Exception as e:
+            logging.exception(e)
+            self._update(job_id, status=FAILED, error=str(e) or repr(e))
+        finally:
+            with self._futures_lock:
+                self._futures.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+            self._partials.pop(job_id, None)
+
+    def get(self, job_id):
+        """
+        Get the status of a job.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            dict: The job with `id`, `kind`, `status`, `progress`, `message`, `error`, `created_at` and `updated_at` keys, or None if unknown.
+        """
+        if not job_id:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, progress, message, error, created_at, "
+                "updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def result(self, job_id):
+        """
+        Get the result of a finished job.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            Any: The return value of the job function, or None if the job is not done.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM jobs WHERE id = ? AND status = ?", (job_id, DONE)
+            ).fetchone()
+        if row is None or row["result"] is None:
+            return None
+        return pickle.loads(row["result"])
+
+    def partial(self, job_id):
+        """
+        Get the latest partial result reported by a running job.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            Any: The partial result, or None if none was reported.
+        """
+        return self._partials.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs never start, running jobs stop at their next progress report.
+
+        Args:
+            job_id (str): The ID of the job.
+        """
+        event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        with self._futures_lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            self._update(job_id, status=CANCELLED)
+            with self._futures_lock:
+                self._futures.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+
+
+job_manager = JobManager()
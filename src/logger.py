@@ -1,14 +1,150 @@
+import constants
+
 import logging
 import os
-from datetime import datetime
+import re
+import copy
+import json
+import queue
+import atexit
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
-log_file = f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.log"
-logs_path = os.path.join(os.getcwd(), "logs")
+logs_path = os.path.join(os.getcwd(), constants.LOG_DIR)
 os.makedirs(logs_path, exist_ok=True)
-LOG_FILE_PATH = os.path.join(logs_path, log_file)
+LOG_FILE_PATH = os.path.join(logs_path, constants.LOG_FILE)
+
+# Fields such as review_id and job_id added to every record logged in the current context
+_log_context = contextvars.ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    Add fields to every record logged in the current context, e.g. review and job IDs.
+
+    Args:
+        **fields: The fields, e.g. review_id="3f2a9c".
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def truncate(text, max_chars=constants.LOG_MAX_MESSAGE_CHARS):
+    """
+    Truncate a long text, e.g. a model output, keeping its beginning.
+
+    Args:
+        text (str): The text.
+        max_chars (int, optional): Maximum number of characters kept, 0 to keep everything.
+
+    Returns:
+        str: The truncated text.
+    """
+    if not max_chars or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [truncated {len(text) - max_chars} chars]"
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format records as single line JSON objects.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": truncate(record.getMessage()),
+        }
+        entry.update(getattr(record, "context", {}))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """
+    File handler rotating the log both at a time interval and when it grows beyond a size.
+    """
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        # Include seconds so that several size based rotations a day get distinct names
+        self.suffix = "%Y-%m-%d_%H-%M-%S"
+        self.extMatch = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$", re.ASCII)
+
+    def rotation_filename(self, default_name):
+        # Name backups by the rotation time rather than the start of the interval
+        return f"{self.baseFilename}.{datetime.now().strftime(self.suffix)}"
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Queue handler attaching the log context to records and dropping records when the queue is full.
+
+    Messages and tracebacks are rendered in the logging thread, so that the
+    listener thread only serializes and writes them.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.context = _log_context.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the caller on a slow disk
+            self.dropped += 1
+
+
+def _configure():
+    root = logging.getLogger()
+    if any(isinstance(handler, ContextQueueHandler) for handler in root.handlers):
+        return
+    file_handler = SizedTimedRotatingFileHandler(
+        LOG_FILE_PATH,
+        max_bytes=constants.LOG_MAX_BYTES,
+        when=constants.LOG_ROTATE_WHEN,
+        backupCount=constants.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(maxsize=constants.LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    root.addHandler(ContextQueueHandler(log_queue))
+    root.setLevel(constants.LOG_LEVEL)
+
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
+_configure()
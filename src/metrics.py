@@ -0,0 +1,231 @@
+import constants
+from logger import logging
+
+import os
+import time
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "query_reviews"
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_stages = {}  # stage -> [count, total seconds]
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_server = None
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """
+    Increment a counter, e.g. LLM calls, prompt characters or cache hits.
+
+    Args:
+        name (str): Name of the counter.
+        value (float, optional): Amount added to the counter. Defaults to 1.
+        **labels: Labels of the counter, e.g. model="gemini-pro".
+    """
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    trace = _current_trace.get()
+    if trace is not None:
+        with _lock:
+            counts = trace["counts"]
+            counts[name] = counts.get(name, 0) + value
+
+
+def observe(stage_name, seconds):
+    """
+    Record the duration of a stage.
+
+    Args:
+        stage_name (str): Name of the stage.
+        seconds (float): Duration in seconds.
+    """
+    with _lock:
+        stats = _stages.setdefault(stage_name, [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+    trace = _current_trace.get()
+    if trace is not None:
+        with _lock:
+            durations = trace["seconds"]
+            durations[stage_name] = durations.get(stage_name, 0.0) + seconds
+
+
+@contextmanager
+def stage(stage_name):
+    """
+    Time a pipeline stage.
+
+    Args:
+        stage_name (str): Name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage_name, time.perf_counter() - start)
+
+
+def timed(stage_name):
+    """
+    Decorator timing every call of a function as a pipeline stage.
+
+    Args:
+        stage_name (str): Name of the stage.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def new_trace():
+    """
+    Create an empty per-review trace.
+
+    Returns:
+        dict: Trace with `seconds` (stage durations) and `counts` (counters) dictionaries.
+    """
+    return {"seconds": {}, "counts": {}}
+
+
+@contextmanager
+def trace(review_trace):
+    """
+    Also record the stages and counters of the current thread into a per-review trace.
+
+    Args:
+        review_trace (dict): Trace created by `new_trace`.
+    """
+    token = _current_trace.set(review_trace)
+    try:
+        yield review_trace
+    finally:
+        _current_trace.reset(token)
+        export()
+
+
+def bind(func):
+    """
+    Bind a function to the context of the calling thread (trace, log context), so that it is kept when the function runs in a worker thread.
+
+    Args:
+        func (Callable): The function.
+
+    Returns:
+        Callable: The bound function.
+    """
+    context = contextvars.copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Each call gets its own copy as a context cannot be entered by several threads
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def render():
+    """
+    Render all metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics.
+    """
+    with _lock:
+        counters = dict(_counters)
+        stages = {k: list(v) for k, v in _stages.items()}
+
+    lines = [f"# TYPE {PREFIX}_stage_seconds summary"]
+    for stage_name, (calls, seconds) in sorted(stages.items()):
+        labels = _format_labels([("stage", stage_name)])
+        lines.append(f"{PREFIX}_stage_seconds_sum{labels} {seconds}")
+        lines.append(f"{PREFIX}_stage_seconds_count{labels} {calls}")
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append(f"{PREFIX}_{name}_total{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path=constants.METRICS_FILE):
+    """
+    Write all metrics to a file in the Prometheus text format, e.g. for the node exporter textfile collector.
+
+    Args:
+        path (str, optional): Path of the metrics file.
+    """
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(render())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.exception(e)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=constants.METRICS_PORT):
+    """
+    Serve the metrics on http://0.0.0.0:<port>/metrics in a background thread, once per process.
+
+    Args:
+        port (int, optional): The port. Falsy values disable the server.
+    """
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError as e:
+            logging.exception(e)
+            return
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
@@ -23,18 +23,26 @@ prompt_review_summary = """
     Format Instructions: \n{format_instructions}\n        
     """
 
-prompt_benchmark_data = """
-    Input: Image data (URL or uploaded file)
+query_review_overview = """
+    Fetch the Title and Author of the website and generate a clear summary of the review, ensuring that the sentiment (positive or negative) is discernible from the summary.
+    """
 
-    Task: Benchmark Data Detection and Extraction
+prompt_review_overview = """
+    Generate the output based on the context below. The output must be in the specified JSON format.      
+        title: This must be the Title of the Website. If you don't know the answer, set the value as empty.
+        author: This must be the Author of the Website or review. If you don't know the answer, set the value as empty.
+        summary: This must be the summary of the review. If you don't know the answer, set the value as empty.
+    Context: \n{context}?\n
+    Question: \n{question}\n
+    Format Instructions: \n{format_instructions}\n        
+    """
 
-    Objective: Identify if the image contains benchmark data.
+# Rules shared by the single and batched benchmark prompts
+benchmark_data_description = """\
         Generally benchmark data will include charts, tables and numbers comparing various
-        products such as laptops, processors, CPUs, GPUs, NPUs, battery life etc.
-        If the probability of the image containing benchmark data is 1, then extract and infer specific benchmark data from the image.
-        If the probability of the image containing benchmark data is less than 1, then do not analyze the image further.
+        products such as laptops, processors, CPUs, GPUs, NPUs, battery life etc."""
 
-    Output: JSON object with extracted benchmark data as follows:
+benchmark_data_fields = """\
         is_benchmark: This field must be set to True or False based on if the image contains benchmark data or not.
             If this field is set to False, then the rest of the JSON fields must be set to their corresponding empty values.
             if this field is set to True, then populate the rest of the JSON fields as follows:
@@ -61,7 +69,35 @@ prompt_benchmark_data = """
             product_score: This must be the benchmark score of the product.
                 Example 1: 12576
                 Example 2: 8310
-                Example 3: 9623
+                Example 3: 9623"""
+
+prompt_benchmark_data = f"""
+    Input: Image data (URL or uploaded file)
+
+    Task: Benchmark Data Detection and Extraction
+
+    Objective: Identify if the image contains benchmark data.
+{benchmark_data_description}
+        If the probability of the image containing benchmark data is 1, then extract and infer specific benchmark data from the image.
+        If the probability of the image containing benchmark data is less than 1, then do not analyze the image further.
+
+    Output: JSON object with extracted benchmark data as follows:
+{benchmark_data_fields}
+    """
+
+prompt_benchmark_data_batch = f"""
+    Input: {{num_images}} images (URLs or uploaded files)
+
+    Task: Benchmark Data Detection and Extraction for each image
+
+    Objective: Identify if each image contains benchmark data. Analyze every image independently.
+{benchmark_data_description}
+        If the probability of an image containing benchmark data is 1, then extract and infer specific benchmark data from the image.
+        If the probability of an image containing benchmark data is less than 1, then do not analyze the image further.
+
+    Output: JSON object with a list of exactly {{num_images}} benchmarks, one per image in the order the images are given.
+        Each benchmark in the list must be as follows:
+{benchmark_data_fields}
     """
 
 query_overall_summary = """
@@ -75,3 +111,15 @@ prompt_overall_summary = """
     Question: \n{question}\n
     Format Instructions: \n{format_instructions}\n        
     """
+
+query_partial_summary = """
+    Combine the review summaries in the context into one summary of the Intel Core Ultra processor, keeping the strengths, weaknesses and sentiment (positive or negative) of every review.
+    """
+
+prompt_partial_summary = """
+    Generate the output based on the context below. The output must be in the specified JSON format.
+        summary: This must be the combined summary of all the reviews in the context. If you don't know the answer, set the value as empty.
+    Context: \n{context}\n
+    Question: \n{question}\n
+    Format Instructions: \n{format_instructions}\n
+    """
@@ -0,0 +1,213 @@
+import constants
+import metrics
+from cache import result_cache
+from logger import logging
+
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ResultStore:
+    """
+    Process-wide store of pipeline results shared by all sessions.
+
+    Results are keyed by what they were computed from (URL, content hash) and
+    the pipeline version. Concurrent requests for the same key share a single
+    computation. Results are kept pickled, so every caller gets its own copy,
+    and the least recently used ones are evicted beyond `max_bytes`. With a
+    persistent cache, results are also written to disk and survive restarts.
+    """
+
+    def __init__(self, max_bytes=constants.RESULT_STORE_MAX_BYTES, cache=None):
+        """
+        Initialize the store.
+
+        Args:
+            max_bytes (int, optional): Memory budget of the results.
+            cache (ResultCache, optional): Persistent cache of the results, kept in memory only if None.
+        """
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> pickled result
+        self._size = 0
+        self._inflight = {}  # key -> Future of the pickled result
+
+    @staticmethod
+    def make_key(kind, *parts):
+        """
+        Build a store key.
+
+        Args:
+            kind (str): Kind of result, e.g. "overview".
+            *parts: What the result is computed from, e.g. URL and content hash.
+
+        Returns:
+            tuple: The key.
+        """
+        return (kind, constants.PIPELINE_VERSION) + parts
+
+    @staticmethod
+    def _cache_key(key):
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def _load(self, key):
+        """
+        Load a result from the persistent cache into memory.
+
+        Results that can no longer be unpickled, e.g. after a library upgrade,
+        a renamed class or a truncated write, are deleted so that they are
+        computed again.
+
+        Args:
+            key (tuple): The key.
+
+        Returns:
+            Tuple[bytes, Any]: The pickled result and a copy of it, or None if not cached or unreadable.
+        """
+        if self.cache is None:
+            return None
+        cache_key = self._cache_key(key)
+        data = self.cache.get(cache_key)
+        if data is None:
+            return None
+        try:
+            value = pickle.loads(data)
+        except Exception as e:
+            logging.exception(e)
+            logging.warning(f"Deleting unreadable stored result of {key[0]}")
+            self.cache.delete(cache_key)
+            return None
+        self._put_memory(key, data)
+        return data, value
+
+    def get(self, key):
+        """
+        Look up a stored result.
+
+        Args:
+            key (tuple): The key.
+
+        Returns:
+            Any: A copy of the result, or None if not stored.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is not None:
+            return pickle.loads(data)
+        loaded = self._load(key)
+        return loaded[1] if loaded is not None else None
+
+    def put(self, key, value):
+        """
+        Store a result and evict the least recently used ones beyond the memory budget.
+
+        The result is also written to the persistent cache.
+
+        Args:
+            key (tuple): The key.
+            value (Any): The picklable result.
+        """
+        self._put(key, pickle.dumps(value))
+
+    def _put(self, key, data):
+        if self.cache is not None:
+            self.cache.put(self._cache_key(key), key[0], data)
+        self._put_memory(key, data)
+
+    def _put_memory(self, key, data):
+        if len(data) > self.max_bytes:
+            logging.warning(f"Result of {key[0]} too large to store: {len(data)} bytes")
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_or_compute(self, key, compute, should_store=None):
+        """
+        Get a stored result, computing it once if needed.
+
+        Results not in memory are looked up in the persistent cache before
+        being computed. If the same key is already being computed, the call
+        waits for that computation instead of starting another one. If it
+        fails, one of the waiting calls computes the result again.
+
+        Args:
+            key (tuple): The key.
+            compute (Callable): Function computing the result.
+            should_store (Callable, optional): Predicate deciding whether a computed result is stored, e.g. to skip failed results.
+
+        Returns:
+            Any: The result.
+        """
+        while True:
+            with self._lock:
+                data = self._entries.get(key)
+                if data is not None:
+                    self._entries.move_to_end(key)
+                    future, leader = None, False
+                elif key in self._inflight:
+                    future, leader = self._inflight[key], False
+                else:
+                    future, leader = Future(), True
+                    self._inflight[key] = future
+
+            if data is not None:
+                metrics.count("result_store_hits", kind=key[0])
+                return pickle.loads(data)
+            if leader:
+                break
+            try:
+                data = future.result()
+            except Exception:
+                # The shared computation failed or was cancelled, compute it again
+                continue
+            metrics.count("result_store_shared", kind=key[0])
+            return pickle.loads(data)
+
+        try:
+            # Stored by a previous process, or evicted from memory only
+            loaded = self._load(key)
+            if loaded is not None:
+                metrics.count("result_store_hits", kind=key[0])
+                data, value = loaded
+            else:
+                metrics.count("result_store_misses", kind=key[0])
+                value = compute()
+                data = pickle.dumps(value)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        if loaded is None and (should_store is None or should_store(value)):
+            self._put(key, data)
+        # Only release the key once stored, so that no second computation starts
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(data)
+        return value
+
+    def clear(self):
+        """
+        Remove all stored results, including the persistent ones.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.cache is not None:
+            self.cache.clear()
+
+
+result_store = ResultStore(cache=result_cache)
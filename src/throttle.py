@@ -0,0 +1,88 @@
+from logger import logging
+
+import time
+import random
+import threading
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter shared by concurrent callers.
+
+    Tokens are refilled continuously at `requests_per_minute / 60` per second
+    up to `burst` tokens. Each request consumes one token.
+    """
+
+    def __init__(self, requests_per_minute, burst=1):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            requests_per_minute (float): Maximum sustained request rate. Falsy values disable the limiter.
+            burst (int, optional): Maximum number of requests allowed at once. Defaults to 1.
+        """
+        self.rate = (requests_per_minute or 0) / 60
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request is allowed.
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_retry(
+    func,
+    is_retryable,
+    retries,
+    base_delay,
+    max_delay,
+    rate_limiter=None,
+):
+    """
+    Call a function, retrying transient failures with exponential backoff and full jitter.
+
+    Args:
+        func (Callable): Function to call without arguments.
+        is_retryable (Callable[[Exception], bool]): Returns True if the exception is transient.
+        retries (int): Maximum number of retries.
+        base_delay (float): Backoff delay in seconds before the first retry.
+        max_delay (float): Maximum backoff delay in seconds.
+        rate_limiter (RateLimiter, optional): Rate limiter acquired before every attempt.
+
+    Returns:
+        Any: The return value of the function.
+
+    Raises:
+        Exception: The last exception if it is not transient or all retries failed.
+    """
+    for attempt in range(retries + 1):
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            return func()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            logging.warning(
+                f"Transient error ({e!r}), retrying in {delay:.1f}s "
+                f"({attempt + 1}/{retries})"
+            )
+            time.sleep(delay)
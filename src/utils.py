@@ -1,15 +1,18 @@
 import constants
+import metrics
+from browser import driver_pool
+from cache import fetch_cache
+from workspace import write_file_atomic
 from logger import logging
 
 import os
+import json
+import hashlib
 import time
 import re
 import shutil
+import threading
 from urllib.parse import urlparse
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -17,8 +20,16 @@ from youtube_transcript_api import YouTubeTranscriptApi
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-from typing import Set
+import difflib
+from concurrent.futures import ThreadPoolExecutor
 from pytube import YouTube
+from PIL import Image
+import cv2
+
+BENCHMARK_KEYWORDS_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in constants.BENCHMARK_KEYWORDS) + r")\b",
+    re.IGNORECASE,
+)
 
 
 def create_directory(directory, overwrite=False):
@@ -66,6 +77,36 @@ def is_youtube_link(url):
     return bool(match)
 
 
+def get_review_id(url):
+    """
+    Get a short stable ID of a review, used to correlate its logs and files.
+
+    Args:
+        url (str): The URL of the review.
+
+    Returns:
+        str: The ID.
+    """
+    return hashlib.sha256((url or "").encode()).hexdigest()[:12]
+
+
+def get_youtube_video_id(url):
+    """
+    Extract the video ID from a YouTube URL.
+
+    Args:
+        url (str): The URL of the YouTube video.
+
+    Returns:
+        str: The video ID, or None if it cannot be found.
+    """
+    match = re.search(r"(?<=v=)[^&#]+", url) or re.search(
+        r"(?<=youtu\.be\/)[^?&#]+", url
+    )
+    return match.group(0) if match else None
+
+
+@metrics.timed("fetch_metadata")
 def collect_youtube_metadata(url):
     """
     Collect metadata (channel name, title) from a YouTube video.
@@ -77,13 +118,22 @@ def collect_youtube_metadata(url):
         tuple: A tuple containing channel name and title.
     """
     channel_name, title = None, None
+    cache_key = f"youtube:metadata:{get_youtube_video_id(url) or url}"
+    cached = fetch_cache.get(cache_key)
+    if cached and cached["fresh"]:
+        channel_name, title = json.loads(cached["body"])
+        return channel_name, title
     try:
         yt = YouTube(url)
         if yt:
             channel_name = yt.author
             title = yt.title
+            fetch_cache.put(cache_key, json.dumps([channel_name, title]))
     except Exception as e:
         logging.exception(e)
+        if cached:
+            # Fall back to the stale entry rather than losing the metadata
+            channel_name, title = json.loads(cached["body"])
     return channel_name, title
 
 
@@ -105,6 +155,138 @@ def collect_website_metadata(url):
     return website_name
 
 
+@metrics.timed("fetch_transcript")
+def fetch_youtube_transcript(url):
+    """
+    Fetch the timestamped transcript of a YouTube video, using the fetch cache.
+
+    Args:
+        url (str): The URL of the YouTube video.
+
+    Returns:
+        List[dict]: Transcript segments with `text`, `start` and `duration` keys.
+    """
+    video_id = get_youtube_video_id(url)
+    cache_key = f"youtube:transcript:{video_id}"
+    cached = fetch_cache.get(cache_key)
+    if cached and cached["fresh"]:
+        return json.loads(cached["body"])
+    try:
+        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+    except Exception:
+        if not cached:
+            raise
+        # Transcripts rarely change, so a stale copy beats a failed review
+        logging.exception(f"Using stale transcript for {video_id}")
+        return json.loads(cached["body"])
+    fetch_cache.put(cache_key, json.dumps(transcript))
+    return transcript
+
+
+@metrics.timed("fetch_website")
+def fetch_website(url):
+    """
+    Fetch the HTML of a website, using the fetch cache.
+
+    Stale cache entries are revalidated with a conditional request based on
+    the stored ETag/Last-Modified headers.
+
+    Args:
+        url (str): The URL of the website.
+
+    Returns:
+        str: The HTML of the website, or None if it could not be fetched.
+    """
+    cache_key = f"url:{url}"
+    cached = fetch_cache.get(cache_key)
+    if cached and cached["fresh"]:
+        return cached["body"]
+
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = requests.get(url, headers=headers)
+    metrics.count("http_requests", status=response.status_code)
+    if response.status_code == 304 and cached:
+        fetch_cache.touch(cache_key)
+        return cached["body"]
+    if response.status_code == 200:
+        fetch_cache.put(
+            cache_key,
+            response.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.text
+
+    logging.error(
+        f"Failed to fetch website content. Status code: {response.status_code}"
+    )
+    return None
+
+
+def invalidate_cached_content(url):
+    """
+    Remove all fetch cache entries of a review URL so that it is refetched.
+
+    Args:
+        url (str): The URL of the review.
+    """
+    if is_youtube_link(url):
+        video_id = get_youtube_video_id(url) or url
+        fetch_cache.invalidate(f"youtube:metadata:{video_id}")
+        fetch_cache.invalidate(f"youtube:transcript:{video_id}")
+    else:
+        fetch_cache.invalidate(f"url:{url}")
+
+
+def get_content_hash(url):
+    """
+    Compute the hash of the current content of a review, i.e. its transcript or page text.
+
+    The text is hashed rather than the HTML of a page, so that changing markup
+    such as ads or tracking tokens does not invalidate stored results.
+
+    Args:
+        url (str): The URL of the review.
+
+    Returns:
+        str: The SHA-256 hex digest of the content, or None if it could not be fetched.
+    """
+    try:
+        if is_youtube_link(url):
+            content = json.dumps(fetch_youtube_transcript(url))
+        else:
+            html = fetch_website(url)
+            content = extract_website_text(html) if html is not None else None
+    except Exception as e:
+        logging.exception(e)
+        return None
+    if content is None:
+        return None
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_images_hash(images):
+    """
+    Compute the hash of uploaded images.
+
+    Args:
+        images (List[BytesIO]): List of image data.
+
+    Returns:
+        str: The SHA-256 hex digest of the images in order.
+    """
+    images_hash = hashlib.sha256()
+    for image in images:
+        images_hash.update(hashlib.sha256(image.getvalue()).digest())
+    return images_hash.hexdigest()
+
+
 def collect_youtube_content(url, dir_path):
     """
     Collect transcript from a YouTube video and save it to a file.
@@ -116,16 +298,32 @@ def collect_youtube_content(url, dir_path):
     if not dir_path:
         return
     try:
-        create_directory(dir_path, overwrite=True)
-        video_id = re.search(r"(?<=v=)[^&#]+", url).group(0)
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
-        with open(os.path.join(dir_path, constants.CONTENT_FILE), "w") as file:
-            for segment in transcript:
-                file.write(f"{segment['text']}\n")
+        create_directory(dir_path)
+        transcript = fetch_youtube_transcript(url)
+        write_file_atomic(
+            os.path.join(dir_path, constants.CONTENT_FILE),
+            "".join(f"{segment['text']}\n" for segment in transcript),
+        )
     except Exception as e:
         logging.exception(e)
 
 
+def extract_website_text(html):
+    """
+    Extract the text content of a web page.
+
+    Args:
+        html (str): The HTML of the page.
+
+    Returns:
+        str: The text content without empty lines.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    text_content = soup.get_text()
+    # Remove empty lines
+    return "\n".join(line for line in text_content.splitlines() if line.strip())
+
+
 def collect_website_content(url, dir_path):
     """
     Collect text content from a website and save it to a file.
@@ -137,32 +335,230 @@ def collect_website_content(url, dir_path):
     if not dir_path:
         return
     try:
-        create_directory(dir_path, overwrite=True)
-        response = requests.get(url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            text_content = soup.get_text()
-            # Remove empty lines
-            text_content = "\n".join(
-                line for line in text_content.splitlines() if line.strip()
-            )
-            with open(os.path.join(dir_path, constants.CONTENT_FILE), "w") as file:
-                file.write(text_content)
-        else:
-            logging.error(
-                f"Failed to fetch website content. Status code: {response.status_code}"
+        create_directory(dir_path)
+        html = fetch_website(url)
+        if html is not None:
+            write_file_atomic(
+                os.path.join(dir_path, constants.CONTENT_FILE),
+                extract_website_text(html),
             )
     except Exception as e:
         logging.exception(e)
 
 
-def collect_youtube_images(url, dir_path):
+def score_transcript_segment(text):
+    """
+    Score a transcript segment by the number of benchmark keywords it mentions.
+
+    Args:
+        text (str): The text of the segment.
+
+    Returns:
+        int: The number of keyword matches.
+    """
+    return len(BENCHMARK_KEYWORDS_PATTERN.findall(text))
+
+
+def plan_capture_times(duration, transcript=None):
+    """
+    Plan the video timestamps to capture.
+
+    Timestamps are sampled densely around transcript segments that mention
+    benchmark keywords and sparsely elsewhere. Without a transcript the video
+    is sampled at a fixed interval. A transcript never leads to more captures
+    than the fixed interval would: beyond that, the captures are thinned out
+    evenly.
+
+    Args:
+        duration (float): Duration of the video in seconds.
+        transcript (List[dict], optional): Transcript segments with `text`, `start` and `duration` keys.
+
+    Returns:
+        List[int]: Sorted timestamps in seconds.
+    """
+    # Skip the first 60 seconds of typical YouTube jabber
+    start = constants.CAPTURE_SKIP if duration > constants.CAPTURE_SKIP else 0
+
+    fixed_times = list(range(start, int(duration), constants.CAPTURE_INTERVAL))
+    if not transcript:
+        return fixed_times
+
+    windows = []
+    for segment in transcript:
+        if score_transcript_segment(segment["text"]) < constants.MIN_SEGMENT_SCORE:
+            continue
+        window_start = max(start, segment["start"] - constants.CAPTURE_WINDOW_BEFORE)
+        window_end = min(
+            duration,
+            segment["start"]
+            + segment.get("duration", 0)
+            + constants.CAPTURE_WINDOW_AFTER,
+        )
+        if window_start >= window_end:
+            continue
+        if windows and window_start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], window_end)
+        else:
+            windows.append([window_start, window_end])
+
+    capture_times = set()
+    for window_start, window_end in windows:
+        capture_times.update(
+            range(int(window_start), int(window_end), constants.DENSE_CAPTURE_INTERVAL)
+        )
+    if constants.SPARSE_CAPTURE_INTERVAL:
+        for capture_time in range(
+            start, int(duration), constants.SPARSE_CAPTURE_INTERVAL
+        ):
+            if not any(a <= capture_time < b for a, b in windows):
+                capture_times.add(capture_time)
+    capture_times = sorted(capture_times)
+    if len(capture_times) > len(fixed_times):
+        step = len(capture_times) / len(fixed_times)
+        capture_times = [capture_times[int(i * step)] for i in range(len(fixed_times))]
+    return capture_times
+
+
+def get_capture_times(url, duration, guided=constants.TRANSCRIPT_GUIDED_CAPTURE):
+    """
+    Plan the timestamps to capture from a YouTube video, using its transcript if available.
+
+    Args:
+        url (str): The URL of the YouTube video. Can be None for local videos.
+        duration (float): Duration of the video in seconds.
+        guided (bool, optional): Flag indicating whether to plan captures around transcript segments mentioning benchmarks.
+
+    Returns:
+        List[int]: Sorted timestamps in seconds.
+    """
+    transcript = None
+    if guided and url:
+        try:
+            transcript = fetch_youtube_transcript(url)
+        except Exception as e:
+            logging.exception(e)
+    return plan_capture_times(duration, transcript)
+
+
+def split_shards(items, shards):
+    """
+    Split a list into contiguous shards of nearly equal size.
+
+    Args:
+        items (list): The list to split.
+        shards (int): The number of shards.
+
+    Returns:
+        List[list]: The non-empty shards in order.
+    """
+    shards = max(1, min(shards, len(items)))
+    size, remainder = divmod(len(items), shards)
+    result, start = [], 0
+    for i in range(shards):
+        end = start + size + (1 if i < remainder else 0)
+        result.append(items[start:end])
+        start = end
+    return [shard for shard in result if shard]
+
+
+def run_shards(func, shards):
+    """
+    Run a function on every shard in parallel, logging failures of individual shards.
+
+    Args:
+        func (Callable): Function called with a shard.
+        shards (List[list]): The shards.
+    """
+
+    def run(shard):
+        try:
+            func(shard)
+        except Exception as e:
+            logging.exception(e)
+
+    with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+        list(executor.map(metrics.bind(run), shards))
+
+
+def get_image_file_name(capture_time):
+    """
+    Get the file name of an image captured at a timestamp, sortable by time.
+
+    Args:
+        capture_time (int): The timestamp in seconds.
+
+    Returns:
+        str: The file name.
+    """
+    return f"image_{capture_time:05d}.png"
+
+
+def open_youtube_video(driver, url):
+    """
+    Open a YouTube video in a browser and start playing it.
+
+    Args:
+        driver (webdriver.Chrome): The browser.
+        url (str): The URL of the YouTube video.
+
+    Returns:
+        float: Duration of the video in seconds.
+    """
+    driver.get(url)
+    WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.TAG_NAME, "video"))
+    )
+    time.sleep(2)
+    duration = driver.execute_script(
+        "return document.getElementsByTagName('video')[0].duration"
+    )
+    driver.find_element(By.CSS_SELECTOR, ".ytp-large-play-button").click()
+    WebDriverWait(driver, 20).until(
+        lambda _: driver.execute_script(
+            "return document.getElementsByTagName('video')[0].currentTime > 0"
+        )
+    )
+    return duration
+
+
+def capture_youtube_frames(driver, images_path, capture_times):
+    """
+    Save screenshots of an open YouTube video at the given timestamps.
+
+    Args:
+        driver (webdriver.Chrome): The browser playing the video.
+        images_path (str): The directory path to save the images.
+        capture_times (List[int]): Timestamps in seconds.
+    """
+    for capture_time in capture_times:
+        driver.execute_script(
+            f"document.getElementsByTagName('video')[0].currentTime = {capture_time};"
+        )
+        time.sleep(2)
+        write_file_atomic(
+            os.path.join(images_path, get_image_file_name(capture_time)),
+            driver.get_screenshot_as_png(),
+        )
+
+
+@metrics.timed("capture_images")
+def collect_youtube_images(
+    url,
+    dir_path,
+    guided=constants.TRANSCRIPT_GUIDED_CAPTURE,
+    shards=constants.CAPTURE_SHARDS,
+):
     """
     Capture images from a YouTube video and save them.
 
+    With more than one shard, the planned timestamps are split into contiguous
+    shards that are captured in parallel, each in its own browser.
+
     Args:
         url (str): The URL of the YouTube video.
         dir_path (str): The directory path to save the images.
+        guided (bool, optional): Flag indicating whether to plan captures around transcript segments mentioning benchmarks.
+        shards (int, optional): Number of browsers capturing in parallel.
 
     Returns:
         str: The directory path where the images are saved.
@@ -172,46 +568,139 @@ def collect_youtube_images(url, dir_path):
         images_path = os.path.join(dir_path, "images")
         create_directory(images_path, overwrite=True)
 
-        options = Options()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--headless")
-        options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()), options=options
-        )
-        driver.set_window_size(1920, 1080)
-        driver.get(url)
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.TAG_NAME, "video"))
-        )
-        time.sleep(2)
-        duration = driver.execute_script(
-            "return document.getElementsByTagName('video')[0].duration"
+        with driver_pool.driver() as driver:
+            duration = open_youtube_video(driver, url)
+            capture_times = get_capture_times(url, duration, guided)
+            logging.info(f"Capturing {len(capture_times)} images from {url}")
+            capture_shards = split_shards(capture_times, shards)
+            if len(capture_shards) <= 1:
+                capture_youtube_frames(driver, images_path, capture_times)
+                return images_path
+
+        def capture_shard(shard):
+            with driver_pool.driver() as shard_driver:
+                open_youtube_video(shard_driver, url)
+                capture_youtube_frames(shard_driver, images_path, shard)
+
+        run_shards(capture_shard, capture_shards)
+    except Exception as e:
+        logging.exception(e)
+    return images_path
+
+
+@metrics.timed("download_video")
+def download_youtube_video(url, dir_path):
+    """
+    Download a YouTube video, reusing a previous download if present.
+
+    Args:
+        url (str): The URL of the YouTube video.
+        dir_path (str): The directory path to save the video.
+
+    Returns:
+        str: The path of the downloaded video, or None if the download failed.
+    """
+    video_path = os.path.join(dir_path, constants.VIDEO_FILE)
+    if os.path.exists(video_path):
+        return video_path
+    try:
+        create_directory(dir_path)
+        stream = (
+            YouTube(url)
+            .streams.filter(progressive=True, file_extension="mp4")
+            .order_by("resolution")
+            .desc()
+            .first()
         )
-        driver.find_element(By.CSS_SELECTOR, ".ytp-large-play-button").click()
-        WebDriverWait(driver, 20).until(
-            lambda _: driver.execute_script(
-                "return document.getElementsByTagName('video')[0].currentTime > 0"
+        # Download under a temporary name so that other runs never read a partial video
+        tmp_file = f".{constants.VIDEO_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        stream.download(output_path=dir_path, filename=tmp_file)
+        os.replace(os.path.join(dir_path, tmp_file), video_path)
+    except Exception as e:
+        logging.exception(e)
+        return None
+    return video_path
+
+
+def capture_video_frames(video_path, images_path, capture_times):
+    """
+    Decode frames of a video file at the given timestamps and save them.
+
+    Args:
+        video_path (str): The path of the video file.
+        images_path (str): The directory path to save the images.
+        capture_times (List[int]): Timestamps in seconds.
+    """
+    capture = cv2.VideoCapture(video_path)
+    try:
+        for capture_time in capture_times:
+            capture.set(cv2.CAP_PROP_POS_MSEC, capture_time * 1000)
+            success, frame = capture.read()
+            if not success:
+                logging.warning(f"Cannot read frame at {capture_time}s")
+                continue
+            success, image = cv2.imencode(".png", frame)
+            if not success:
+                logging.warning(f"Cannot encode frame at {capture_time}s")
+                continue
+            write_file_atomic(
+                os.path.join(images_path, get_image_file_name(capture_time)),
+                image.tobytes(),
             )
+    finally:
+        capture.release()
+
+
+@metrics.timed("capture_images")
+def collect_video_images(
+    video_path,
+    dir_path,
+    url=None,
+    guided=constants.TRANSCRIPT_GUIDED_CAPTURE,
+    shards=constants.VIDEO_CAPTURE_SHARDS,
+):
+    """
+    Capture images from a local video file and save them.
+
+    Frames are decoded directly from the file by seeking to each planned
+    timestamp, which is much faster than playing the video in a browser. The
+    timestamps are split into shards decoded in parallel.
+
+    Args:
+        video_path (str): The path of the video file.
+        dir_path (str): The directory path to save the images.
+        url (str, optional): The URL of the YouTube video, used to plan captures from its transcript.
+        guided (bool, optional): Flag indicating whether to plan captures around transcript segments mentioning benchmarks.
+        shards (int, optional): Number of decoders capturing in parallel.
+
+    Returns:
+        str: The directory path where the images are saved.
+    """
+    images_path = None
+    try:
+        images_path = os.path.join(dir_path, "images")
+        create_directory(images_path, overwrite=True)
+
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video {video_path}")
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        duration = frame_count / fps if fps else 0
+        capture.release()
+
+        capture_times = get_capture_times(url, duration, guided)
+        logging.info(f"Capturing {len(capture_times)} images from {video_path}")
+        run_shards(
+            lambda shard: capture_video_frames(video_path, images_path, shard),
+            split_shards(capture_times, shards),
         )
-        current_time = (
-            60 if duration > 60 else 0
-        )  # skip first 60 seconds of typical YouTube jabber
-        time_interval = 10
-        while current_time < duration:
-            image_path = os.path.join(images_path, f"image_{current_time}.png")
-            driver.save_screenshot(image_path)
-            current_time += time_interval
-            driver.execute_script(
-                f"document.getElementsByTagName('video')[0].currentTime = {current_time};"
-            )
-            time.sleep(2)
-        driver.quit()
     except Exception as e:
         logging.exception(e)
     return images_path
 
 
+@metrics.timed("capture_images")
 def collect_website_images(images, dir_path):
     """
     Save images from a website.
@@ -229,14 +718,87 @@ def collect_website_images(images, dir_path):
         create_directory(images_path, overwrite=True)
 
         for i, image in enumerate(images):
-            with open(os.path.join(images_path, f"image_{i}.png"), "wb") as file:
-                file.write(image.getbuffer())
+            write_file_atomic(
+                os.path.join(images_path, get_image_file_name(i)), image.getvalue()
+            )
     except Exception as e:
         logging.exception(e)
 
     return images_path
 
 
+def get_image_hash(image_path, hash_size=8):
+    """
+    Compute the perceptual difference hash (dHash) of an image.
+
+    Args:
+        image_path (str): Path of the image.
+        hash_size (int, optional): Width and height of the hash grid. Defaults to 8.
+
+    Returns:
+        int: The hash as a `hash_size * hash_size` bit integer.
+    """
+    with Image.open(image_path) as image:
+        pixels = list(image.convert("L").resize((hash_size + 1, hash_size)).getdata())
+    image_hash = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            image_hash = (image_hash << 1) | (left > right)
+    return image_hash
+
+
+def get_image_sort_key(file_name):
+    """
+    Get a key sorting image files by the number in their name (capture time or index).
+
+    Args:
+        file_name (str): Name of the image file.
+
+    Returns:
+        tuple: The sort key.
+    """
+    match = re.search(r"\d+(\.\d+)?", file_name)
+    return (float(match.group(0)) if match else float("inf"), file_name)
+
+
+@metrics.timed("dedupe_images")
+def dedupe_images(images_path, threshold=constants.IMAGE_HASH_THRESHOLD):
+    """
+    Remove near-duplicate images from a directory using perceptual hashes.
+
+    An image is removed if its hash is within `threshold` bits of an image
+    kept before it, in capture order.
+
+    Args:
+        images_path (str): The directory containing the images.
+        threshold (int, optional): Maximum Hamming distance between hashes of duplicate images.
+
+    Returns:
+        int: The number of images removed.
+    """
+    removed = 0
+    if not images_path or not os.path.isdir(images_path):
+        return removed
+    kept_hashes = []
+    for file_name in sorted(os.listdir(images_path), key=get_image_sort_key):
+        image_path = os.path.join(images_path, file_name)
+        try:
+            image_hash = get_image_hash(image_path)
+        except Exception as e:
+            logging.exception(e)
+            continue
+        if any(bin(image_hash ^ h).count("1") <= threshold for h in kept_hashes):
+            os.remove(image_path)
+            removed += 1
+        else:
+            kept_hashes.append(image_hash)
+    metrics.count("images_captured", removed + len(kept_hashes))
+    metrics.count("images_removed", removed)
+    return removed
+
+
 def get_overview_df(result):
     """
     Generate an overview DataFrame from the collected data.
@@ -258,45 +820,166 @@ def get_overview_df(result):
     return df
 
 
+def get_timings_df(trace):
+    """
+    Generate a DataFrame breaking down the time spent in each stage of a review.
+
+    Args:
+        trace (dict): The per-review trace with `seconds` and `counts` dictionaries.
+
+    Returns:
+        pandas.DataFrame: DataFrame with one row per stage and counter.
+    """
+    data = [
+        [stage_name, "Seconds", round(seconds, 3)]
+        for stage_name, seconds in trace["seconds"].items()
+    ]
+    data.extend([name, "Count", value] for name, value in trace["counts"].items())
+    return pd.DataFrame(data, columns=["Stage", "Unit", "Value"])
+
+
+class ProductNameIndex:
+    """
+    Index mapping product names to canonical names.
+
+    Names are normalized (case, punctuation, vendor and filler words) and looked up in
+    an alias map. Unknown names are fuzzy matched against the names seen so far
+    as long as their model numbers, including letter suffixes such as the "H"
+    of "155H", are identical, otherwise they become new canonical names.
+    """
+
+    FILLER_WORDS_PATTERN = re.compile(
+        r"\b(" + "|".join(constants.PRODUCT_FILLER_WORDS) + r")\b", re.IGNORECASE
+    )
+
+    def __init__(
+        self,
+        aliases=constants.PRODUCT_ALIASES,
+        cutoff=constants.PRODUCT_MATCH_CUTOFF,
+    ):
+        """
+        Initialize the index.
+
+        Args:
+            aliases (dict, optional): Map of canonical names to lists of aliases.
+            cutoff (float, optional): Minimum similarity (0 to 1) for fuzzy matches.
+        """
+        self.cutoff = cutoff
+        self._canonical_names = {}  # Normalized name -> canonical name
+        for canonical_name, names in aliases.items():
+            for name in [canonical_name] + names:
+                self._canonical_names[self.normalize(name)] = canonical_name
+        self._keys_by_models = {}  # Model numbers -> normalized names
+        for key in self._canonical_names:
+            self._keys_by_models.setdefault(self._get_models(key), []).append(key)
+
+    @classmethod
+    def normalize(cls, name):
+        """
+        Normalize a product name for lookups.
+
+        Args:
+            name (str): The product name.
+
+        Returns:
+            str: The normalized name.
+        """
+        name = re.sub(r"\((tm|r)\)|[™®]", "", str(name), flags=re.IGNORECASE)
+        name = cls.FILLER_WORDS_PATTERN.sub("", name)
+        name = re.sub(r"[^0-9a-z]+", " ", name.lower())
+        return name.strip()
+
+    @staticmethod
+    def _get_models(key):
+        # Suffixes tell chips apart, e.g. 155U and 155H or 7940H and 7940HS
+        return tuple(re.findall(r"\d+[a-z]*", key))
+
+    def canonicalize(self, name):
+        """
+        Get the canonical name of a product, registering it if it is new.
+
+        Args:
+            name (str): The product name.
+
+        Returns:
+            str: The canonical name.
+        """
+        key = self.normalize(name)
+        canonical_name = self._canonical_names.get(key)
+        if canonical_name is not None:
+            return canonical_name
+
+        models = self._get_models(key)
+        candidates = self._keys_by_models.setdefault(models, [])
+        matches = difflib.get_close_matches(key, candidates, n=1, cutoff=self.cutoff)
+        canonical_name = self._canonical_names[matches[0]] if matches else name.strip()
+        self._canonical_names[key] = canonical_name
+        candidates.append(key)
+        return canonical_name
+
+
+@metrics.timed("benchmarks_df")
 def get_benchmarks_df(benchmarks):
     """
     Generate a DataFrame for benchmarks.
 
+    Benchmarks with the same name, type and metric are merged into one row, and
+    product names are merged through a ProductNameIndex. If a product has
+    conflicting scores in the same benchmark, the other scores are kept in
+    additional rows of that benchmark. Rows and product columns are ordered by
+    first appearance and scores are kept numeric.
+
     Args:
         benchmarks: List of benchmarks.
 
     Returns:
         pandas.DataFrame: DataFrame for benchmarks.
     """
-    unique_products: Set[str] = set()
-    for benchmark in benchmarks:
-        if benchmark.is_benchmark:
-            for product in benchmark.products:
-                unique_products.add(product.name)
-
-    columns = ["Benchmark", "Type", "Metric"] + [
-        product_name for product_name in unique_products
+    columns = ["Benchmark", "Type", "Metric"]
+    product_index = ProductNameIndex()
+    records = [
+        (
+            benchmark.name,
+            benchmark.type,
+            benchmark.metric,
+            product_index.canonicalize(product.name),
+            product.score,
+        )
+        for benchmark in benchmarks
+        if benchmark.is_benchmark
+        for product in benchmark.products
     ]
-    data = []
-    for benchmark in benchmarks:
-        if benchmark.is_benchmark:
-            row = [
-                benchmark.name,
-                benchmark.type,
-                benchmark.metric,
-            ]
-            for product_name in unique_products:
-                score = None
-                for product in benchmark.products:
-                    if product_name == product.name:
-                        score = str(product.score)
-                        break
-                row.append(score)
-            data.append(row)
-
-    df = pd.DataFrame(data=data, columns=columns)
-
-    # Handle anomalies
+    if not records:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.DataFrame.from_records(records, columns=columns + ["Product", "Score"])
+    df["Score"] = pd.to_numeric(df["Score"], errors="coerce")
+    products = df["Product"].drop_duplicates()
+
+    # The same chart is often read from several images
     df = df.drop_duplicates()
+    has_score = df.groupby(columns + ["Product"])["Score"].transform("count") > 0
+    df = df[df["Score"].notna() | ~has_score].copy()
+    # Number the scores of every product so that conflicting ones get their own row
+    df["Row"] = df.groupby(columns + ["Product"], sort=False).cumcount()
+    conflicts = df[df["Row"] > 0]
+    if not conflicts.empty:
+        logging.warning(
+            f"Conflicting scores for {len(conflicts)} benchmark products, "
+            f"kept in additional rows: {conflicts[columns + ['Product']].values.tolist()}"
+        )
+    df["Group"] = df.groupby(columns, sort=False).ngroup()
+    rows = pd.MultiIndex.from_frame(
+        df[["Group", "Row"] + columns]
+        .drop_duplicates()
+        .sort_values(["Group", "Row"])[columns + ["Row"]]
+    )
 
-    return df
+    df = (
+        df.set_index(columns + ["Row", "Product"])["Score"]
+        .unstack("Product")
+        .reindex(index=rows, columns=products)
+        .convert_dtypes()
+    )
+    df.columns.name = None
+    return df.reset_index().drop(columns="Row")
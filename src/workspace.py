@@ -0,0 +1,205 @@
+import constants
+from logger import logging
+
+import os
+import time
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+
+LEASE_FILE = ".lease"
+
+
+def write_file_atomic(path, data):
+    """
+    Write a file atomically, so that readers never see a partially written file.
+
+    The data is written to a hidden temporary file in the same directory, which
+    then replaces the target.
+
+    Args:
+        path (str): Path of the file.
+        data (str | bytes): The content.
+    """
+    dir_path, file_name = os.path.split(path)
+    tmp_path = os.path.join(dir_path, f".{file_name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_directory_size(path):
+    """
+    Get the total size of the files in a directory.
+
+    Args:
+        path (str): The directory.
+
+    Returns:
+        int: Size in bytes.
+    """
+    size = 0
+    for root, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                size += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return size
+
+
+class WorkspaceManager:
+    """
+    Per-review working directories under the data directory.
+
+    Every review run gets its own directory named after the review ID (a hash
+    of its URL) and the run, so concurrent reviews never write into each
+    other's files. A workspace is leased while in use: its lease file is
+    touched whenever it is acquired. Garbage collection only removes
+    workspaces that are not acquired in this process and whose lease expired,
+    oldest first, when they are older than `max_age` or the workspaces use
+    more than `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        root=constants.DATA_DIR,
+        max_age=constants.WORKSPACE_MAX_AGE,
+        max_bytes=constants.WORKSPACE_MAX_BYTES,
+        lease_ttl=constants.WORKSPACE_LEASE_TTL,
+        gc_interval=constants.WORKSPACE_GC_INTERVAL,
+    ):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lease_ttl = lease_ttl
+        self.gc_interval = gc_interval
+        self._lock = threading.Lock()
+        self._active = {}  # path -> number of holders in this process
+        self._last_gc = 0
+
+    def create(self, review_id, run=None):
+        """
+        Create the workspace of a review run.
+
+        Args:
+            review_id (str): The ID of the review, a hash of its URL.
+            run (str, optional): Name of the run, e.g. "video" for a workspace shared by all runs. A new unique run by default.
+
+        Returns:
+            str: The directory path of the workspace.
+        """
+        run = run or f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.root, f"{review_id}-{run}")
+        os.makedirs(path, exist_ok=True)
+        self.touch(path)
+        self.maybe_gc()
+        return path
+
+    def touch(self, path):
+        """
+        Renew the lease of a workspace.
+
+        Args:
+            path (str): The directory path of the workspace.
+        """
+        try:
+            with open(os.path.join(path, LEASE_FILE), "a"):
+                pass
+            os.utime(os.path.join(path, LEASE_FILE))
+        except OSError as e:
+            logging.exception(e)
+
+    @contextmanager
+    def acquire(self, path):
+        """
+        Hold a workspace, protecting it from garbage collection.
+
+        Args:
+            path (str): The directory path of the workspace. Nothing is held if None.
+        """
+        if not path:
+            yield path
+            return
+        with self._lock:
+            self._active[path] = self._active.get(path, 0) + 1
+        os.makedirs(path, exist_ok=True)
+        self.touch(path)
+        try:
+            yield path
+        finally:
+            self.touch(path)
+            with self._lock:
+                self._active[path] -= 1
+                if not self._active[path]:
+                    del self._active[path]
+
+    def _is_leased(self, path):
+        try:
+            last_used = os.path.getmtime(os.path.join(path, LEASE_FILE))
+        except OSError:
+            return False
+        return time.time() - last_used < self.lease_ttl
+
+    def maybe_gc(self):
+        """
+        Start a garbage collection in the background if none ran recently.
+        """
+        with self._lock:
+            if time.time() - self._last_gc < self.gc_interval:
+                return
+            self._last_gc = time.time()
+        threading.Thread(target=self.gc, daemon=True).start()
+
+    def gc(self):
+        """
+        Remove expired workspaces.
+
+        Returns:
+            int: The number of workspaces removed.
+        """
+        now = time.time()
+        workspaces = []
+        total_size = 0
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            lease_path = os.path.join(path, LEASE_FILE)
+            if not os.path.isfile(lease_path):
+                # Not a workspace, e.g. a directory of an older version
+                continue
+            try:
+                last_used = os.path.getmtime(lease_path)
+            except OSError:
+                continue
+            size = get_directory_size(path)
+            total_size += size
+            workspaces.append((last_used, path, size))
+
+        removed = 0
+        for last_used, path, size in sorted(workspaces):
+            expired = now - last_used > self.max_age
+            if not expired and total_size <= self.max_bytes:
+                break
+            with self._lock:
+                # Check again as the workspace may have been used since it was listed
+                if path in self._active or self._is_leased(path):
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            removed += 1
+        if removed:
+            logging.info(f"Removed {removed} expired workspaces")
+        return removed
+
+
+workspace_manager = WorkspaceManager()